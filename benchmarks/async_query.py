@@ -0,0 +1,99 @@
+"""Benchmark query throughput of AsyncMesonetSatelliteDB at 1, 8 and 32 concurrent queries.
+
+Run against a local Neo4j database using the credentials in your .env file:
+
+    python benchmarks/async_query.py -e .env
+
+or without a database, against a stand-in that simulates the round trip latency of a query:
+
+    python benchmarks/async_query.py --stand-in --latency 0.05
+"""
+import argparse
+import asyncio
+import datetime as dt
+import os
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+from mt_mesonet_satellite import AsyncMesonetSatelliteDB
+
+ELEMENTS = ["NDVI", "EVI", "ET", "GPP", "LAI", "Fpar", "PET"]
+
+
+class StandInDB(AsyncMesonetSatelliteDB):
+    """AsyncMesonetSatelliteDB with the database round trip replaced by a fixed sleep."""
+
+    def __init__(self, latency: float, max_concurrency: int = 8) -> None:
+        self.latency = latency
+        self.max_concurrency = max_concurrency
+
+    async def query(self, station, start_time, end_time, element):
+        await asyncio.sleep(self.latency)
+        return pd.DataFrame(
+            {"station": [station], "date": [start_time], "element": [element]}
+        )
+
+    async def close(self):
+        pass
+
+
+async def run(conn, requests, concurrency):
+    start = time.perf_counter()
+    await conn.gather_query(requests, max_concurrency=concurrency)
+    return len(requests) / (time.perf_counter() - start)
+
+
+async def main(args):
+    if args.stand_in:
+        conn = StandInDB(latency=args.latency)
+        stations = [f"station{i}" for i in range(20)]
+    else:
+        load_dotenv(args.env)
+        conn = AsyncMesonetSatelliteDB(
+            uri=os.getenv("Neo4jURI"),
+            user=os.getenv("Neo4jUser"),
+            password=os.getenv("Neo4jPassword"),
+        )
+        stations = pd.read_csv(
+            "https://mesonet.climate.umt.edu/api/v2/stations?type=csv"
+        )["station"].to_list()
+
+    end_time = int((dt.datetime.now() - dt.datetime(1970, 1, 1)).total_seconds())
+    start_time = end_time - 365 * 86400
+    requests = [
+        (station, start_time, end_time, element)
+        for station in stations
+        for element in ELEMENTS
+    ][: args.n]
+
+    try:
+        for concurrency in [1, 8, 32]:
+            rate = await run(conn, requests, concurrency)
+            print(f"concurrency={concurrency:>2}: {rate:8.1f} queries/sec")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark concurrent satellite queries.")
+    parser.add_argument(
+        "-e", "--env", type=str, default=".env", help="Path to your .env file."
+    )
+    parser.add_argument(
+        "-n", type=int, default=140, help="Number of queries to run per level."
+    )
+    parser.add_argument(
+        "--stand-in",
+        action="store_true",
+        help="Use a simulated database instead of connecting to Neo4j.",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds each simulated query takes when using --stand-in.",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -0,0 +1,127 @@
+"""Benchmark Cleaner.clean against the previous per-layer .loc/pivot_longer implementation.
+
+Run on a real AppEEARS .csv (the product metadata is fetched from AppEEARS):
+
+    python benchmarks/clean.py -f /path/to/MOD13A1-061-results.csv
+
+or on a synthetic file of a given size, which needs no network access:
+
+    python benchmarks/clean.py --rows 200000 --layers 12
+"""
+import argparse
+import time
+
+import janitor  # noqa: F401, registers pivot_longer
+import numpy as np
+import pandas as pd
+
+from mt_mesonet_satellite import Cleaner
+from mt_mesonet_satellite.Product import Layer
+
+
+def legacy_clean(c: Cleaner) -> pd.DataFrame:
+    """Cleaner.clean as it was before the numpy masking engine, for daily products."""
+    dat = c.raw[["ID", "Date"] + list(c.layers.keys())].copy()
+
+    for k, v in c.layers.items():
+        dat.loc[dat[k] > v.ValidMax, k] = np.nan
+        dat.loc[dat[k] < v.ValidMin, k] = np.nan
+        dat.loc[dat[k] == v.FillValue, k] = np.nan
+
+    dat = dat.pivot_longer(index=["ID", "Date"], names_to="element")
+    dat = dat.assign(product=c.product)
+
+    unit_map = {k: v.Units for k, v in c.layers.items()}
+    dat = dat.assign(units=dat["element"])
+    dat = dat.replace({"units": unit_map})
+
+    return dat
+
+
+def synthetic_cleaner(rows: int, n_layers: int) -> Cleaner:
+    """Build a Cleaner around random data without reading a file or fetching metadata."""
+    rng = np.random.default_rng(42)
+    layers = {
+        f"layer_{i}": Layer(
+            AddOffset=None,
+            Available=True,
+            DataType="float32",
+            Description="",
+            Dimensions=["time", "lat", "lon"],
+            FillValue=-3000,
+            IsQA=False,
+            Layer=f"layer_{i}",
+            OrigDataType="int16",
+            OrigValidMax=10000,
+            OrigValidMin=-2000,
+            QualityLayers="",
+            QualityProductAndVersion="",
+            ScaleFactor=None,
+            Units="NDVI" if i % 2 else "unitless",
+            ValidMax=1.0,
+            ValidMin=-0.2,
+            XSize=1,
+            YSize=1,
+        )
+        for i in range(n_layers)
+    }
+    raw = pd.DataFrame(
+        rng.uniform(-0.5, 1.5, size=(rows, n_layers)), columns=list(layers)
+    )
+    raw.iloc[::7, :] = -3000
+    raw.insert(
+        0,
+        "Date",
+        pd.date_range("2000-01-01", periods=rows, freq="h").strftime("%Y-%m-%d"),
+    )
+    raw.insert(0, "ID", rng.choice([f"station{i}" for i in range(100)], size=rows))
+
+    c = Cleaner.__new__(Cleaner)
+    c.f = "synthetic"
+    c.is_subdaily = False
+    c.product = "SYNTHETIC.001"
+    c.raw = raw
+    c.layers = layers
+    c.stream = False
+    c.quality = None
+    c.qa_layers = {}
+    return c
+
+
+def timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark Cleaner.clean.")
+    parser.add_argument(
+        "-f", "--file", type=str, default=None, help="AppEEARS .csv to clean."
+    )
+    parser.add_argument(
+        "--rows", type=int, default=200000, help="Rows of synthetic data."
+    )
+    parser.add_argument(
+        "--layers", type=int, default=12, help="Layers of synthetic data."
+    )
+    args = parser.parse_args()
+
+    c = Cleaner(args.file) if args.file else synthetic_cleaner(args.rows, args.layers)
+    cells = c.raw.shape[0] * len(c.layers)
+    print(f"{c.raw.shape[0]} rows x {len(c.layers)} layers = {cells:,} cells")
+
+    legacy_time, legacy = timed(legacy_clean, c)
+    new_time, new = timed(c.clean)
+
+    assert len(legacy) == len(new)
+    np.testing.assert_allclose(
+        legacy["value"].to_numpy(dtype=float), new["value"].to_numpy()
+    )
+
+    print(f"legacy: {legacy_time:.3f}s ({cells/legacy_time:,.0f} cells/sec)")
+    print(f"numpy:  {new_time:.3f}s ({cells/new_time:,.0f} cells/sec)")
+    print(f"speedup: {legacy_time/new_time:.1f}x")
@@ -0,0 +1,318 @@
+"""Measure wall time and peak RSS of clean_all + to_db_format on a directory of AppEEARS .csv files.
+
+Each mode runs in its own process so peak RSS isn't shared between them:
+
+ - baseline: Cleaner.clean, clean_all and to_db_format as they were before the typed
+   pipeline, with object columns from pd.read_csv, pivot_longer and chained assigns.
+   Layer metadata comes from the current Product so neither mode goes to AppEEARS twice.
+ - typed: the pipeline as is, with categorical columns from the .csv read onwards.
+
+    python benchmarks/pipeline.py /path/to/appeears/csvs
+
+or on synthetic MOD13A1, MOD16A2 and sub-daily SPL4SMGP files, with a product cache
+written next to them so no network access is needed:
+
+    python benchmarks/pipeline.py --synthetic 200000
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import janitor  # noqa: F401, registers pivot_longer, groupby_agg and deconcatenate_column
+import numpy as np
+import pandas as pd
+
+from mt_mesonet_satellite import Product, clean_all, to_db_format
+
+MODES = ["baseline", "typed"]
+
+# Synthetic products: layer name -> (units, valid min, valid max, fill value, is QA).
+SYNTHETIC = {
+    "MOD13A1.061": {
+        "_500m_16_days_NDVI": ("NDVI", -2000, 10000, -3000, False),
+        "_500m_16_days_EVI": ("EVI", -2000, 10000, -3000, False),
+        "_500m_16_days_VI_Quality": ("bit field", 0, 65534, 65535, True),
+    },
+    "MOD16A2.061": {
+        "ET_500m": ("kg/m^2/8day", -32767, 32700, 32767, False),
+        "PET_500m": ("kg/m^2/8day", -32767, 32700, 32767, False),
+        "ET_QC_500m": ("bit field", 0, 254, 255, True),
+    },
+    "SPL4SMGP.007": {
+        "Geophysical_Data_sm_surface": ("m3/m3", 0, 1, -9999, False),
+        "Geophysical_Data_sm_rootzone": ("m3/m3", 0, 1, -9999, False),
+    },
+}
+
+
+def legacy_clean(f: Path) -> pd.DataFrame:
+    """Cleaner(f, is_subdaily).clean() as it was before the typed pipeline."""
+    parts = f.stem.split("-")
+    product = f"{parts[-3]}.{parts[-2]}"
+    raw = pd.read_csv(f)
+    raw.columns = raw.columns.str.replace(f"{parts[-3]}_{parts[-2]}_", "")
+    meta = Product(product)
+    layers = {k: v for k, v in meta.layers.items() if k in raw.columns}
+    is_subdaily = "SPL4SMGP" in f.stem
+    if is_subdaily:
+        for k, v in meta.layers.items():
+            for hour in range(0, 24):
+                if f"{k}_{hour}" in raw.columns:
+                    layers[f"{k}_{hour}"] = v
+    layers = {k: v for k, v in layers.items() if not v.IsQA}
+
+    dat = raw[["ID", "Date"] + list(layers.keys())]
+    for k, v in layers.items():
+        dat.loc[dat[k] > v.ValidMax, k] = np.nan
+        dat.loc[dat[k] < v.ValidMin, k] = np.nan
+        dat.loc[dat[k] == v.FillValue, k] = np.nan
+
+    dat = dat.pivot_longer(index=["ID", "Date"], names_to="element")
+    if is_subdaily:
+        dat = dat.assign(spl=dat.element.str.split("_"))
+        dat = dat.assign(hour=dat.spl.str[-1])
+        dat = dat.assign(element=dat.spl.str[:-1].str.join("_"))
+        dat = dat.drop(columns="spl")
+        dat = (
+            dat.groupby_agg(
+                by=["ID", "Date", "element"],
+                agg="mean",
+                agg_column_name="value",
+                new_column_name="value",
+                dropna=True,
+            )
+            .drop(columns="hour")
+            .drop_duplicates()
+            .reset_index(drop=True)
+        )
+    dat = dat.assign(product=product)
+
+    unit_map = {k: v.Units for k, v in layers.items()}
+    dat = dat.assign(units=dat["element"])
+    dat = dat.replace({"units": unit_map})
+    return dat
+
+
+def legacy_to_db_format(dat: pd.DataFrame) -> pd.DataFrame:
+    """to_db_format as it was before the typed pipeline, without the write step."""
+    dat = dat.assign(Date=pd.to_datetime(dat["Date"], utc=True))
+    dat = dat.assign(
+        Date=(dat["Date"] - pd.Timestamp("1970-01-01", tz="UTC")) // pd.Timedelta("1s")
+    )
+    dat = dat.rename(
+        columns={"ID": "station", "Date": "timestamp", "product": "platform"}
+    )
+    dat = dat.replace(
+        {
+            "element": {
+                "ET_500m": "ET",
+                "Fpar_500m": "Fpar",
+                "GPP_gpp_mean": "GPP",
+                "Geophysical_Data_sm_rootzone": "sm_rootzone",
+                "Geophysical_Data_sm_rootzone_wetness": "sm_rootzone_wetness",
+                "Geophysical_Data_sm_surface": "sm_surface",
+                "Geophysical_Data_sm_surface_wetness": "sm_surface_wetness",
+                "Gpp_500m": "GPP",
+                "Lai_500m": "LAI",
+                "PET_500m": "PET",
+                "_500m_16_days_EVI": "EVI",
+                "_500m_16_days_NDVI": "NDVI",
+                "_500_m_16_days_EVI": "EVI",
+                "_500_m_16_days_NDVI": "NDVI",
+                "EVAPOTRANSPIRATION_ALEXI_ETdaily": "ET",
+                "EVAPOTRANSPIRATION_PT_JPL_ETdaily": "ET",
+            }
+        }
+    )
+    dat = dat.assign(
+        id=dat.station
+        + "_"
+        + dat.timestamp.astype(str)
+        + "_"
+        + dat.platform
+        + "_"
+        + dat.element
+    )
+    dat = dat.assign(units=dat.units.fillna("unitless"))
+    dat = dat.assign(value=dat.value.fillna(-9999))
+    dat = dat.assign(
+        units=np.where(
+            (dat.units == "EVI") | (dat.units == "NDVI"), "unitless", dat.units
+        )
+    )
+    dat = dat.assign(
+        value=np.where(
+            (dat.platform != "SPL4CMDL.006") & (dat.element == "GPP"),
+            (dat.value * 1000) / 8,
+            dat.value,
+        )
+    )
+    dat = dat.assign(
+        value=np.where(
+            (dat.element == "ET") & (dat.platform != "ECO3ETALEXI.001"),
+            dat.value / 8,
+            dat.value,
+        )
+    )
+    dat = dat.assign(value=np.where(dat.element == "PET", dat.value / 8, dat.value))
+    dat = dat.assign(
+        units=np.where(
+            (dat.platform != "SPL4CMDL.006") & (dat.element == "GPP"),
+            "gCm^-2day^-1",
+            dat.units,
+        )
+    )
+    dat = dat[dat["element"] != "Geophysical_Data_sm_rootzone_pctl"]
+    dat = dat[dat["element"] != "_500_m_16_days_EVI2"]
+    dat = dat.drop_duplicates()
+    return dat.reset_index(drop=True)
+
+
+def write_synthetic(dirname: Path, cache_f: Path, rows: int):
+    """Write one synthetic AppEEARS .csv per product to `dirname` and a product cache describing their layers to `cache_f`."""
+    rng = np.random.default_rng(42)
+    stations = np.array([f"station{i}" for i in range(100)])
+    dates = pd.date_range("2000-01-01", periods=rows // 100 + 1, freq="D").strftime(
+        "%Y-%m-%d"
+    )
+    cache = {}
+    for product, layers in SYNTHETIC.items():
+        name, version = product.split(".")
+        cache[product] = {
+            "fetched": time.time(),
+            "layers": {
+                layer: {
+                    "AddOffset": None,
+                    "Available": True,
+                    "DataType": "float32",
+                    "Description": "",
+                    "Dimensions": ["time", "lat", "lon"],
+                    "FillValue": fill,
+                    "IsQA": is_qa,
+                    "Layer": layer,
+                    "OrigDataType": "int16",
+                    "OrigValidMax": valid_max,
+                    "OrigValidMin": valid_min,
+                    "QualityLayers": "",
+                    "QualityProductAndVersion": "",
+                    "ScaleFactor": None,
+                    "Units": units,
+                    "ValidMax": valid_max,
+                    "ValidMin": valid_min,
+                    "XSize": 1,
+                    "YSize": 1,
+                }
+                for layer, (units, valid_min, valid_max, fill, is_qa) in layers.items()
+            },
+        }
+
+        # Sub-daily layers have one column per 3 hourly step.
+        columns = [
+            f"{layer}_{hour}" if product.startswith("SPL4SMGP") else layer
+            for layer in layers
+            for hour in (range(8) if product.startswith("SPL4SMGP") else [None])
+        ]
+        dat = pd.DataFrame(
+            {
+                f"{name}_{version}_{c}": np.where(
+                    rng.random(rows) < 0.05,
+                    layers[c.rsplit("_", 1)[0] if c not in layers else c][3],
+                    rng.uniform(0, 1, size=rows),
+                )
+                for c in columns
+            }
+        )
+        dat.insert(0, "Date", np.asarray(dates)[np.arange(rows) // 100])
+        dat.insert(0, "ID", stations[np.arange(rows) % 100])
+        dat.to_csv(dirname / f"synthetic-{name}-{version}-results.csv", index=False)
+
+    with open(cache_f, "w") as f:
+        json.dump(cache, f)
+
+
+def run(dirname: str, mode: str, queue: mp.Queue):
+    try:
+        queue.put(timed_run(dirname, mode))
+    except Exception as e:
+        # Report the failure instead of leaving the parent waiting on the queue.
+        queue.put({"error": repr(e)})
+
+
+def timed_run(dirname: str, mode: str) -> dict:
+    start = time.perf_counter()
+    if mode == "baseline":
+        files = sorted(Path(dirname).glob("*.csv"))
+        cleaned = pd.concat([legacy_clean(f) for f in files], axis=0)
+    else:
+        cleaned = clean_all(dirname)
+    cleaned_at = time.perf_counter()
+    if mode == "baseline":
+        formatted = legacy_to_db_format(cleaned)
+    else:
+        formatted = to_db_format(
+            f=cleaned, neo4j_pth=None, out_name=None, write=False, split=False
+        )
+    end = time.perf_counter()
+    return {
+        "rows": len(formatted),
+        "clean": cleaned_at - start,
+        "to_db_format": end - cleaned_at,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def benchmark(dirname: str, modes):
+    ctx = mp.get_context("spawn")
+    for mode in modes:
+        queue = ctx.Queue()
+        p = ctx.Process(target=run, args=(dirname, mode, queue))
+        p.start()
+        result = queue.get()
+        p.join()
+        if "error" in result:
+            raise RuntimeError(f"{mode} failed: {result['error']}")
+        print(
+            f"{mode:>8}: {result['rows']:,} rows, clean {result['clean']:.2f}s, "
+            f"to_db_format {result['to_db_format']:.2f}s, peak RSS {result['peak_rss_mb']:,.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark clean_all + to_db_format.")
+    parser.add_argument(
+        "dirname",
+        type=str,
+        nargs="?",
+        default=None,
+        help="Directory of AppEEARS .csv files.",
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        help="Benchmark synthetic files with this many rows each instead of a directory.",
+    )
+    parser.add_argument(
+        "-m", "--modes", nargs="+", default=MODES, choices=MODES, help="Modes to run."
+    )
+    args = parser.parse_args()
+
+    if args.synthetic is None:
+        if args.dirname is None:
+            parser.error("Give a directory of AppEEARS .csv files or --synthetic.")
+        benchmark(args.dirname, args.modes)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            # clean_all reads every file in the directory, so the cache is kept outside it.
+            dirname, cache_f = Path(tmp) / "csvs", Path(tmp) / "products.json"
+            dirname.mkdir()
+            write_synthetic(dirname, cache_f, args.synthetic)
+            # Spawned processes inherit the environment, so they read this cache.
+            os.environ["ProductCachePath"] = str(cache_f)
+            benchmark(str(dirname), args.modes)
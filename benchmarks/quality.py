@@ -0,0 +1,57 @@
+"""Benchmark QA bitmask masking on a bundle of AppEEARS VIIRS/MODIS .csv files.
+
+Cleans every file with a default QA policy twice, without and with the policy applied,
+and reports the time spent and the share of observations the policy masks:
+
+    python benchmarks/quality.py /path/to/appeears/csvs
+"""
+import argparse
+import time
+from pathlib import Path
+
+from mt_mesonet_satellite import DEFAULT_POLICIES, Cleaner, Product
+
+
+def timed_clean(f: Path, meta: Product, quality):
+    start = time.perf_counter()
+    c = Cleaner(f, meta=meta, quality=quality)
+    dat = c.clean()
+    return time.perf_counter() - start, dat, c
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark QA masking in Cleaner.")
+    parser.add_argument("dirname", type=Path, help="Directory of AppEEARS .csv files.")
+    args = parser.parse_args()
+
+    products = {}
+    totals = {"plain": 0.0, "quality": 0.0, "cells": 0, "masked": 0}
+    for f in sorted(args.dirname.glob("*.csv")):
+        parts = f.stem.split("-")
+        name = f"{parts[-3]}.{parts[-2]}"
+        if name not in DEFAULT_POLICIES:
+            continue
+        if name not in products:
+            products[name] = Product(name)
+
+        plain_time, plain, _ = timed_clean(f, products[name], None)
+        quality_time, checked, c = timed_clean(
+            f, products[name], DEFAULT_POLICIES[name]
+        )
+        masked = int(checked.value.isna().sum() - plain.value.isna().sum())
+
+        totals["plain"] += plain_time
+        totals["quality"] += quality_time
+        totals["cells"] += len(checked)
+        totals["masked"] += masked
+        print(
+            f"{f.name}: {len(checked):,} cells, QA layers {sorted(set(x for v in c.qa_layers.values() for x in v))}, "
+            f"{plain_time:.2f}s -> {quality_time:.2f}s, {masked:,} masked by QA"
+        )
+
+    if totals["cells"]:
+        print(
+            f"total: {totals['cells']:,} cells, {totals['plain']:.2f}s without QA, "
+            f"{totals['quality']:.2f}s with QA ({totals['cells']/totals['quality']:,.0f} cells/sec), "
+            f"{totals['masked']/totals['cells']:.1%} masked by QA"
+        )
@@ -0,0 +1,59 @@
+"""Measure wall time and peak RSS of reformatting a master_db.csv whole vs a chunk at a time.
+
+Each mode runs in its own process so peak RSS isn't shared between them:
+
+ - whole: to_db_format reads and reformats the whole file at once.
+ - stream: stream_to_db_format reads and reformats it --chunksize rows at a time.
+
+    python benchmarks/stream_to_db_format.py /path/to/master_db.csv
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import time
+
+from mt_mesonet_satellite import stream_to_db_format, to_db_format
+
+MODES = ["whole", "stream"]
+
+
+def run(f: str, mode: str, chunksize: int, queue: mp.Queue):
+    start = time.perf_counter()
+    if mode == "whole":
+        rows = len(
+            to_db_format(f=f, neo4j_pth=None, out_name=None, write=False, split=False)
+        )
+    else:
+        rows = sum(len(x) for x in stream_to_db_format(f, chunksize=chunksize))
+    queue.put(
+        {
+            "rows": rows,
+            "time": time.perf_counter() - start,
+            # ru_maxrss is in kilobytes on Linux.
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark whole vs streaming to_db_format.")
+    parser.add_argument("file", type=str, help="master_db.csv file to reformat.")
+    parser.add_argument(
+        "-cs", "--chunksize", type=int, default=1000000, help="Rows read at a time."
+    )
+    parser.add_argument(
+        "-m", "--modes", nargs="+", default=MODES, choices=MODES, help="Modes to run."
+    )
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    for mode in args.modes:
+        queue = ctx.Queue()
+        p = ctx.Process(target=run, args=(args.file, mode, args.chunksize, queue))
+        p.start()
+        result = queue.get()
+        p.join()
+        print(
+            f"{mode:>6}: {result['rows']:,} rows in {result['time']:.2f}s, "
+            f"peak RSS {result['peak_rss_mb']:,.0f} MB"
+        )
@@ -0,0 +1,158 @@
+"""Benchmark to_db_format's rule-table pass against the previous chain of assign/np.where steps.
+
+Both run on the same synthetic cleaned data, with the previous implementation given
+object columns as clean_all used to produce, and their outputs are checked to match
+row for row:
+
+    python benchmarks/to_db_format.py --rows 5000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from mt_mesonet_satellite import to_db_format
+
+PLATFORMS = {
+    "MOD17A2HGF.061": ["Gpp_500m"],
+    "MOD16A2.061": ["ET_500m", "PET_500m"],
+    "MOD13A1.061": ["_500m_16_days_EVI", "_500m_16_days_NDVI"],
+    "SPL4CMDL.006": ["GPP_gpp_mean"],
+    "SPL4SMGP.007": [
+        "Geophysical_Data_sm_surface",
+        "Geophysical_Data_sm_rootzone",
+        "Geophysical_Data_sm_rootzone_pctl",
+    ],
+}
+
+
+def legacy_to_db_format(dat: pd.DataFrame) -> pd.DataFrame:
+    """to_db_format as it was before the rule table, without the write step."""
+    dat = dat.assign(Date=pd.to_datetime(dat["Date"], utc=True))
+    dat = dat.assign(
+        Date=(dat["Date"] - pd.Timestamp("1970-01-01", tz="UTC")) // pd.Timedelta("1s")
+    )
+    dat = dat.rename(
+        columns={"ID": "station", "Date": "timestamp", "product": "platform"}
+    )
+    dat = dat.replace(
+        {
+            "element": {
+                "ET_500m": "ET",
+                "GPP_gpp_mean": "GPP",
+                "Geophysical_Data_sm_rootzone": "sm_rootzone",
+                "Geophysical_Data_sm_surface": "sm_surface",
+                "Gpp_500m": "GPP",
+                "PET_500m": "PET",
+                "_500m_16_days_EVI": "EVI",
+                "_500m_16_days_NDVI": "NDVI",
+            }
+        }
+    )
+    dat = dat.assign(
+        id=dat.station
+        + "_"
+        + dat.timestamp.astype(str)
+        + "_"
+        + dat.platform
+        + "_"
+        + dat.element
+    )
+    dat = dat.assign(units=dat.units.fillna("unitless"))
+    dat = dat.assign(value=dat.value.fillna(-9999))
+    dat = dat.assign(
+        units=np.where(
+            (dat.units == "EVI") | (dat.units == "NDVI"), "unitless", dat.units
+        )
+    )
+    dat = dat.assign(
+        value=np.where(
+            (dat.platform != "SPL4CMDL.006") & (dat.element == "GPP"),
+            (dat.value * 1000) / 8,
+            dat.value,
+        )
+    )
+    dat = dat.assign(
+        value=np.where(
+            (dat.element == "ET") & (dat.platform != "ECO3ETALEXI.001"),
+            dat.value / 8,
+            dat.value,
+        )
+    )
+    dat = dat.assign(value=np.where(dat.element == "PET", dat.value / 8, dat.value))
+    dat = dat.assign(
+        units=np.where(
+            (dat.platform != "SPL4CMDL.006") & (dat.element == "GPP"),
+            "gCm^-2day^-1",
+            dat.units,
+        )
+    )
+    dat = dat[dat["element"] != "Geophysical_Data_sm_rootzone_pctl"]
+    dat = dat[dat["element"] != "_500_m_16_days_EVI2"]
+    dat = dat.drop_duplicates()
+    return dat.reset_index(drop=True)
+
+
+def synthetic(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    pairs = [(p, e) for p, elements in PLATFORMS.items() for e in elements]
+    which = rng.integers(0, len(pairs), size=rows)
+    value = rng.uniform(0, 10, size=rows)
+    value[rng.random(rows) < 0.05] = np.nan
+    # Unique station/date/series combinations, so nothing is dropped as a duplicate.
+    dates = pd.date_range("2000-01-01", periods=rows // 100 + 1, freq="D").strftime(
+        "%Y-%m-%d"
+    )
+    return pd.DataFrame(
+        {
+            "ID": [f"station{i % 100}" for i in range(rows)],
+            "Date": np.asarray(dates)[np.arange(rows) // 100],
+            "element": [pairs[i][1] for i in which],
+            "value": value,
+            "product": [pairs[i][0] for i in which],
+            "units": np.where(which % 3 == 0, None, "mm"),
+        }
+    )
+
+
+def assert_same_output(legacy: pd.DataFrame, new: pd.DataFrame):
+    """Check the rule table produces the same rows and values as the assign chain."""
+    assert len(legacy) == len(new), f"{len(legacy)} rows != {len(new)} rows"
+    for col in ["station", "timestamp", "element", "platform", "units", "id"]:
+        mismatched = (
+            legacy[col].astype(str).to_numpy() != new[col].astype(str).to_numpy()
+        ).sum()
+        assert mismatched == 0, f"{mismatched} rows differ in {col}"
+    # Scale factors are applied as one multiplication rather than a chain, so allow for rounding.
+    close = np.isclose(legacy["value"].to_numpy(), new["value"].to_numpy(), rtol=1e-12)
+    assert close.all(), f"{(~close).sum()} rows differ in value"
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - start, out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Benchmark to_db_format.")
+    parser.add_argument(
+        "--rows", type=int, default=5000000, help="Rows of synthetic data."
+    )
+    args = parser.parse_args()
+
+    dat = synthetic(args.rows)
+    legacy_time, legacy = timed(legacy_to_db_format, dat)
+    typed = dat.astype(
+        {c: "category" for c in ["ID", "Date", "element", "product", "units"]}
+    )
+    new_time, new = timed(
+        lambda x: to_db_format(x, neo4j_pth=None, out_name=None, write=False), typed
+    )
+
+    assert_same_output(legacy, new)
+    print(f"{args.rows:,} rows -> {len(new):,} rows")
+    print(f"assign chain: {legacy_time:.2f}s ({args.rows/legacy_time:,.0f} rows/sec)")
+    print(f"rule table:   {new_time:.2f}s ({args.rows/new_time:,.0f} rows/sec)")
+    print(f"speedup: {legacy_time/new_time:.1f}x")
@@ -0,0 +1,298 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import pandas as pd
+from loguru import logger
+from neo4j.exceptions import ConstraintError
+
+from neo4j import AsyncGraphDatabase
+
+from .Neo4jConn import (
+    GET_EARLIEST,
+    GET_LATEST,
+    HAS_WATERMARKS,
+    INIT_DB,
+    INIT_INDEX,
+    INIT_STATIONS,
+    MARK_WATERMARKS_IF_EMPTY,
+    POST_BATCH,
+    POST_DATA,
+    QUERY,
+    QUERY_COLUMNS,
+    QUERY_MANY,
+    REBUILD_WATERMARKS,
+    UPDATE_WATERMARKS,
+    WATERMARK_SCANS,
+    MesonetSatelliteDB,
+)
+from .to_db_format import find_init_files, observation_ids
+
+
+class AsyncMesonetSatelliteDB:
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        password: str,
+        max_connection_pool_size: int = 100,
+        connection_acquisition_timeout: float = 60.0,
+        fetch_size: int = 1000,
+        max_concurrency: int = 8,
+        compact_ids: bool = False,
+    ) -> None:
+        """Initialize an asyncio Mesonet Satellite DB object and connect to the Neo4j db.
+
+        Args:
+            uri (str): The database URI for the Neo4j database.
+            user (str): The database Neo4j username.
+            password (str): The database Neo4j password.
+            max_connection_pool_size (int, optional): Maximum number of connections the driver keeps open. Defaults to 100.
+            connection_acquisition_timeout (float, optional): Seconds to wait for a free pooled connection before failing. Defaults to 60.0.
+            fetch_size (int, optional): Number of records pulled from the server per batch when reading results. Defaults to 1000.
+            max_concurrency (int, optional): Default number of queries gather_query runs at once. Defaults to 8.
+            compact_ids (bool, optional): Whether observations are keyed by compact int64 ids. Defaults to False.
+        """
+        self.fetch_size = fetch_size
+        self.max_concurrency = max_concurrency
+        self.compact_ids = compact_ids
+        self._has_watermarks = False
+        self.driver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=connection_acquisition_timeout,
+        )
+
+    async def close(self):
+        """Close the connection to the Neo4j database."""
+        await self.driver.close()
+
+    async def init_db_indices(self):
+        """Initialize index relationships and unique constraints, see MesonetSatelliteDB.init_db_indices."""
+        async with self.driver.session() as session:
+            await session.write_transaction(self._init_index)
+            await session.write_transaction(self._run, MARK_WATERMARKS_IF_EMPTY)
+
+    async def init_db(
+        self, f_dir: Union[str, Path], use_path: bool = False, batch_size: int = 10000
+    ):
+        """Initialize the Neo4j database using satellite data derived from the to_db_format.py script.
+
+        Args:
+            f_dir (Union[str, Path]): The directory with the 'data_init' files to save to the database.
+            use_path (bool, optional): Load files from their full path instead of the Neo4j import directory. Defaults to False.
+            batch_size (int, optional): Number of rows committed per transaction. Defaults to 10000.
+        """
+        statement = INIT_DB.format(
+            batch_size=int(batch_size),
+            id="toInteger(line.id)" if self.compact_ids else "line.id",
+        )
+        async with self.driver.session() as session:
+            for f in find_init_files(f_dir):
+                f_path = str(f) if use_path else f"file:///{f.name}"
+                result = await session.run(INIT_STATIONS, f_path=f_path)
+                await result.consume()
+                result = await session.run(statement, f_path=f_path)
+                await result.consume()
+            await session.write_transaction(self._rebuild_watermarks)
+
+    async def query(
+        self, station: str, start_time: int, end_time: int, element: str
+    ) -> pd.DataFrame:
+        """Query the Neo4j database for satellite observations at a station
+
+        Args:
+            station (str): The name of the Montana Mesonet station to query.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            element (str): The satellite indicator to gather data for.
+
+        Returns:
+            pd.DataFrame: A dataframe of the data returned from the query.
+        """
+        async with self.driver.session(fetch_size=self.fetch_size) as session:
+            response = await session.read_transaction(
+                self._build_query,
+                station=station,
+                start_time=start_time,
+                end_time=end_time,
+                element=element,
+            )
+        if len(response) == 0:
+            logger.warning("No available data for this query.")
+            return pd.DataFrame()
+        return pd.DataFrame(response, columns=QUERY_COLUMNS)
+
+    async def query_many(
+        self,
+        stations: List[str],
+        elements: List[str],
+        start_time: int,
+        end_time: int,
+    ) -> pd.DataFrame:
+        """Query the Neo4j database for several stations and elements in a single round trip.
+
+        Args:
+            stations (List[str]): The names of the Montana Mesonet stations to query.
+            elements (List[str]): The satellite indicators to gather data for.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+
+        Returns:
+            pd.DataFrame: A long-format dataframe with the same columns as `query`.
+        """
+        async with self.driver.session(fetch_size=self.fetch_size) as session:
+            response = await session.read_transaction(
+                self._build_query_many,
+                stations=list(stations),
+                elements=list(elements),
+                start_time=start_time,
+                end_time=end_time,
+            )
+        return pd.DataFrame(response, columns=QUERY_COLUMNS)
+
+    async def gather_query(
+        self,
+        requests: Iterable[Tuple[str, int, int, str]],
+        max_concurrency: Optional[int] = None,
+    ) -> List[pd.DataFrame]:
+        """Run many queries concurrently, with at most `max_concurrency` in flight at once.
+
+        Args:
+            requests (Iterable[Tuple[str, int, int, str]]): (station, start_time, end_time, element) tuples
+                with the same meaning as the arguments to `query`.
+            max_concurrency (int, optional): Maximum number of queries to run at once. Defaults to the
+                value given to the constructor.
+
+        Returns:
+            List[pd.DataFrame]: One dataframe per request, in the order the requests were given.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def bounded(station, start_time, end_time, element):
+            async with semaphore:
+                return await self.query(station, start_time, end_time, element)
+
+        return await asyncio.gather(*[bounded(*r) for r in requests])
+
+    async def post(self, dat: pd.DataFrame, batch_size: int = 5000):
+        """Write data to the Neo4j database in batched UNWIND transactions.
+
+        Args:
+            dat (pd.DataFrame): Satellite data reformatted using the to_db_format function.
+            batch_size (int, optional): Number of rows to send per transaction. Defaults to 5000.
+        """
+        n = len(dat)
+        if n == 0:
+            logger.info("No new observations to upload.")
+            return
+        if self.compact_ids and not pd.api.types.is_integer_dtype(dat["id"]):
+            dat = dat.assign(id=observation_ids(dat, compact=True))
+
+        start = time.perf_counter()
+        async with self.driver.session() as session:
+            for idx in range(0, n, batch_size):
+                rows = MesonetSatelliteDB._to_records(dat.iloc[idx : idx + batch_size])
+                try:
+                    await session.write_transaction(self._post_batch, rows)
+                except ConstraintError as e:
+                    logger.warning(
+                        f"Constraint conflict in rows {idx}-{idx + len(rows)}, retrying batch row by row: {e}"
+                    )
+                    for row in rows:
+                        try:
+                            await session.write_transaction(self._post_data, **row)
+                        except ConstraintError as e:
+                            logger.exception(e)
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Uploaded {n} observations in {elapsed:.1f} seconds ({n/elapsed:,.0f} rows/sec)."
+        )
+
+    async def get_latest(self) -> pd.DataFrame:
+        """Get the most recent timestamp of each platform and element across all stations."""
+        async with self.driver.session() as session:
+            if await self._watermarks_complete(session):
+                response = await session.read_transaction(self._get_latest)
+            else:
+                response = await session.read_transaction(
+                    self._values, WATERMARK_SCANS["observation"]["latest"]
+                )
+
+        return MesonetSatelliteDB._format_watermarks(response)
+
+    async def get_earliest(self) -> pd.DataFrame:
+        """Get the oldest timestamp of each platform and element across all stations."""
+        async with self.driver.session() as session:
+            if await self._watermarks_complete(session):
+                response = await session.read_transaction(self._get_earliest)
+            else:
+                response = await session.read_transaction(
+                    self._values, WATERMARK_SCANS["observation"]["earliest"]
+                )
+
+        return MesonetSatelliteDB._format_watermarks(response)
+
+    async def _watermarks_complete(self, session) -> bool:
+        """Check whether the Watermark nodes cover every series in the database."""
+        if not self._has_watermarks:
+            response = await session.read_transaction(self._values, HAS_WATERMARKS)
+            self._has_watermarks = response[0][0]
+            if not self._has_watermarks:
+                logger.warning(
+                    "Watermarks haven't been built for this database, falling back to a full scan. "
+                    "Run rebuild_watermarks to build them."
+                )
+        return self._has_watermarks
+
+    @staticmethod
+    async def _values(tx, statement):
+        result = await tx.run(statement)
+        return await result.values()
+
+    @staticmethod
+    async def _run(tx, statement):
+        await tx.run(statement)
+
+    @staticmethod
+    async def _get_latest(tx):
+        result = await tx.run(GET_LATEST)
+        return await result.values()
+
+    @staticmethod
+    async def _get_earliest(tx):
+        result = await tx.run(GET_EARLIEST)
+        return await result.values()
+
+    @staticmethod
+    async def _rebuild_watermarks(tx):
+        for statement in REBUILD_WATERMARKS:
+            await tx.run(statement)
+
+    @staticmethod
+    async def _post_data(tx, **kwargs):
+        await tx.run(POST_DATA, **kwargs)
+        await tx.run(UPDATE_WATERMARKS, rows=[kwargs])
+
+    @staticmethod
+    async def _post_batch(tx, rows):
+        await tx.run(POST_BATCH, rows=rows)
+        await tx.run(UPDATE_WATERMARKS, rows=rows)
+
+    @staticmethod
+    async def _build_query(tx, **kwargs):
+        result = await tx.run(QUERY, **kwargs)
+        return await result.values()
+
+    @staticmethod
+    async def _build_query_many(tx, **kwargs):
+        result = await tx.run(QUERY_MANY, **kwargs)
+        return await result.values()
+
+    @staticmethod
+    async def _init_index(tx):
+        for statement in INIT_INDEX:
+            await tx.run(statement)
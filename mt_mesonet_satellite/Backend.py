@@ -0,0 +1,109 @@
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+
+QUERY_COLUMNS = ["station", "date", "platform", "element", "value", "units"]
+
+
+class StorageBackend(ABC):
+    """Interface the update and backfill pipeline uses to read and write satellite observations.
+
+    Implementations return query results with the columns in QUERY_COLUMNS, where 'date'
+    is formatted as seconds since 1970-01-01, and accept writes in the format produced by
+    the to_db_format function.
+
+    Attributes:
+        compact_ids (bool): Whether observations are keyed by compact int64 ids instead of strings.
+    """
+
+    compact_ids: bool = False
+
+    @abstractmethod
+    def close(self):
+        """Release any connections or handles held by the backend."""
+
+    @abstractmethod
+    def init_db(self, f_dir: Union[str, Path], **kwargs):
+        """Load the 'data_init' files produced by to_db_format into an empty store.
+
+        Args:
+            f_dir (Union[str, Path]): The directory with the 'data_init' files to load.
+        """
+
+    @abstractmethod
+    def query(
+        self, station: str, start_time: int, end_time: int, element: str
+    ) -> pd.DataFrame:
+        """Query satellite observations of one element at a station.
+
+        Args:
+            station (str): The name of the Montana Mesonet station to query.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            element (str): The satellite indicator to gather data for.
+
+        Returns:
+            pd.DataFrame: A dataframe of the data returned from the query.
+        """
+
+    @abstractmethod
+    def query_many(
+        self,
+        stations: List[str],
+        elements: List[str],
+        start_time: int,
+        end_time: int,
+        wide: bool = False,
+    ) -> pd.DataFrame:
+        """Query several stations and elements at once.
+
+        Args:
+            stations (List[str]): The names of the Montana Mesonet stations to query.
+            elements (List[str]): The satellite indicators to gather data for.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            wide (bool, optional): Whether to pivot the result so each element is its own column. Defaults to False.
+
+        Returns:
+            pd.DataFrame: A long-format dataframe with the same columns as `query`, or a wide dataframe
+            indexed by station, date and platform with one column per element if `wide` is True.
+        """
+
+    @abstractmethod
+    def post(self, dat: pd.DataFrame, batch_size: int = 5000):
+        """Write observations to the store.
+
+        Args:
+            dat (pd.DataFrame): Satellite data reformatted using the to_db_format function.
+            batch_size (int, optional): Number of rows to write at a time. Defaults to 5000.
+        """
+
+    @abstractmethod
+    def get_latest(self) -> pd.DataFrame:
+        """Get the most recent timestamp of each platform and element across all stations.
+
+        Returns:
+            pd.DataFrame: A dataframe with 'date', 'platform' and 'element' columns.
+        """
+
+    @abstractmethod
+    def get_earliest(self) -> pd.DataFrame:
+        """Get the oldest timestamp of each platform and element across all stations.
+
+        Returns:
+            pd.DataFrame: A dataframe with 'date', 'platform' and 'element' columns.
+        """
+
+    @staticmethod
+    def _pivot_wide(dat: pd.DataFrame) -> pd.DataFrame:
+        """Pivot a long query result to one column per element."""
+        dat = dat.pivot_table(
+            index=["station", "date", "platform"],
+            columns="element",
+            values="value",
+            aggfunc="first",
+        ).reset_index()
+        dat.columns.name = None
+        return dat
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Tuple
+
+import pandas as pd
+
+CacheKey = Tuple[str, str, int, int]
+
+
+@dataclass
+class QueryCache:
+    """In-process LRU cache of query results with a time to live.
+
+    Entries are keyed by (station, element, start_time, end_time). A request that falls
+    inside a cached range is answered by slicing that entry, and a request that overlaps
+    or touches a cached range only fetches the missing ends before the two are merged
+    into a single, wider entry. Callers always get their own copy of the data, and a
+    fetch that was running when its station and element were invalidated isn't cached.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept before the least recently used is evicted.
+        ttl (float): Seconds an entry stays valid after it is fetched.
+        hits (int): Requests answered entirely from the cache.
+        partial_hits (int): Requests answered by extending a cached range.
+        misses (int): Requests that had to be fetched in full.
+    """
+
+    maxsize: int = 256
+    ttl: float = 3600.0
+    hits: int = field(default=0, init=False)
+    partial_hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _entries: "OrderedDict[CacheKey, Tuple[float, pd.DataFrame]]" = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    _generations: Dict[Tuple[str, str], int] = field(
+        default_factory=dict, init=False, repr=False
+    )
+    _epoch: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def get(
+        self,
+        station: str,
+        element: str,
+        start_time: int,
+        end_time: int,
+        fetch: Callable[[int, int], pd.DataFrame],
+    ) -> pd.DataFrame:
+        """Get a query result from the cache, fetching whatever part of it is missing.
+
+        Args:
+            station (str): The name of the Montana Mesonet station.
+            element (str): The satellite indicator.
+            start_time (int): The start of the range formatted as seconds since 1970-01-01.
+            end_time (int): The end of the range formatted as seconds since 1970-01-01.
+            fetch (Callable[[int, int], pd.DataFrame]): Function that queries the database for a
+                (start_time, end_time) range of this station and element.
+
+        Returns:
+            pd.DataFrame: The query result for the requested range.
+        """
+        # The lock is only held while reading or updating entries, not while fetching.
+        with self._lock:
+            self._expire()
+            generation = self._generation(station, element)
+            key, entry = self._find(station, element, start_time, end_time)
+            if entry is None:
+                self.misses += 1
+            elif key[2] <= start_time and key[3] >= end_time:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._slice(entry[1], start_time, end_time)
+            else:
+                self.partial_hits += 1
+
+        if entry is None:
+            dat = fetch(start_time, end_time)
+            with self._lock:
+                if self._generation(station, element) == generation:
+                    self._put(
+                        (station, element, start_time, end_time),
+                        time.monotonic(),
+                        dat.copy(),
+                    )
+            return dat
+
+        # Fetch only the ends of the range that aren't cached and merge them in.
+        _, _, cached_start, cached_end = key
+        expires, dat = entry
+        dfs = [dat]
+        if start_time < cached_start:
+            dfs.append(fetch(start_time, cached_start - 1))
+        if end_time > cached_end:
+            dfs.append(fetch(cached_end + 1, end_time))
+        dfs = [x for x in dfs if len(x)]
+        merged = pd.concat(dfs, ignore_index=True) if dfs else dat
+        if len(merged):
+            merged = merged.sort_values("date", ignore_index=True)
+
+        with self._lock:
+            # Only replace the entry if it wasn't invalidated while fetching.
+            if self._generation(station, element) == generation:
+                self._entries.pop(key, None)
+                new_key = (
+                    station,
+                    element,
+                    min(start_time, cached_start),
+                    max(end_time, cached_end),
+                )
+                self._put(new_key, expires - self.ttl, merged)
+        return self._slice(merged, start_time, end_time)
+
+    def invalidate(self, station: str, element: str):
+        """Drop every cached range of a station and element.
+
+        Args:
+            station (str): The name of the Montana Mesonet station.
+            element (str): The satellite indicator.
+        """
+        with self._lock:
+            self._generations[(station, element)] = (
+                self._generations.get((station, element), 0) + 1
+            )
+            for key in [k for k in self._entries if k[:2] == (station, element)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Get the hit and miss counters and the current number of entries.
+
+        Returns:
+            Dict[str, int]: Counters keyed by 'hits', 'partial_hits', 'misses' and 'size'.
+        """
+        return {
+            "hits": self.hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+    def _find(self, station: str, element: str, start_time: int, end_time: int):
+        """Find the cached range of a station and element that overlaps the request the most."""
+        best_key, best_overlap = None, None
+        for key in self._entries:
+            if key[:2] != (station, element):
+                continue
+            _, _, cached_start, cached_end = key
+            # Adjacent ranges count, since the missing part is still a single contiguous fetch.
+            if cached_start > end_time + 1 or cached_end < start_time - 1:
+                continue
+            overlap = min(end_time, cached_end) - max(start_time, cached_start)
+            if best_overlap is None or overlap > best_overlap:
+                best_key, best_overlap = key, overlap
+        if best_key is None:
+            return None, None
+        return best_key, self._entries[best_key]
+
+    def _generation(self, station: str, element: str) -> Tuple[int, int]:
+        """Changes whenever the cached ranges of a station and element are dropped."""
+        return self._epoch, self._generations.get((station, element), 0)
+
+    def _put(self, key: CacheKey, fetched: float, dat: pd.DataFrame):
+        self._entries[key] = (fetched + self.ttl, dat)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+            del self._entries[key]
+
+    @staticmethod
+    def _slice(dat: pd.DataFrame, start_time: int, end_time: int) -> pd.DataFrame:
+        if len(dat) == 0:
+            return pd.DataFrame()
+        dat = dat[(dat["date"] >= start_time) & (dat["date"] <= end_time)]
+        if len(dat) == 0:
+            return pd.DataFrame()
+        return dat.reset_index(drop=True)
@@ -1,13 +1,22 @@
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-import janitor
 import numpy as np
 import pandas as pd
 from loguru import logger
 
 from .Product import Layer, Product
+from .Quality import DEFAULT_POLICIES, QualityPolicy, quality_layer_names
+
+# Rough bytes of memory each cleaned long-format cell takes on its way to the database,
+# counting the copies made by clean and to_db_format.
+BYTES_PER_CELL = 200
+DEFAULT_MEMORY_BUDGET = 256 * 2**20
+
+# Columns of the cleaned data that are stored as categoricals.
+CATEGORICAL_COLUMNS = ["ID", "Date", "element", "product", "units"]
 
 
 @dataclass
@@ -18,25 +27,36 @@ class Cleaner:
         f (Union[str, Path]): Path to the .csv file to clean.
         is_subdaily (bool): Whether or not the product has sub-daily observations.
         product (str): The product name. Derived from the filename.
-        raw (pd.DataFrame): The raw data from the .csv. Derived from the filename.
-        meta (Product): Product object providing metadata. Derived from filename.
+        raw (pd.DataFrame): The ID, Date and layer columns of the .csv, with ID and Date as categoricals and layers as float64.
+            Derived from the filename. Only the header is read if `stream` is True.
+        meta (Optional[Product]): Product object providing metadata. Fetched from AppEEARS based on the filename if not given.
         layers (Dict[str, Layer]): Dict of layer objects associated with a product. Derived from filename.
+        to_daily (bool): Whether to aggregate sub-daily layers to daily means. If False, the hour of each
+            observation is added to its Date.
+        stream (bool): Whether to read the .csv lazily, in chunks, with `iter_clean` instead of loading it up front.
+        quality (Optional[QualityPolicy]): Rules to decode the QA layers with. Observations that fail them are set to NA.
+            If None, QA layers aren't read.
+        qa_layers (Dict[str, List[str]]): The QA layers checked for each science layer. Derived from `quality` and the .csv columns.
     """
 
     f: Union[str, Path]
     is_subdaily: bool = False
     product: str = field(init=False)
     raw: pd.DataFrame = field(init=False)
-    meta: Product = field(init=False)
+    meta: Optional[Product] = None
     layers: Dict[str, Layer] = field(init=False)
+    to_daily: bool = True
+    stream: bool = False
+    quality: Optional[QualityPolicy] = None
+    qa_layers: Dict[str, List[str]] = field(init=False)
 
     def __post_init__(self):
         self.f = self.f if isinstance(self.f, Path) else Path(self.f)
-        parts = self.f.stem.split("-")
-        self.product = f"{parts[-3]}.{parts[-2]}"
-        self.raw = pd.read_csv(self.f)
-        self.raw.columns = self.raw.columns.str.replace(f"{parts[-3]}_{parts[-2]}_", "")
-        self.meta = Product(self.product)
+        self.product = _product_name(self.f)
+        self.raw = pd.read_csv(self.f, nrows=0)
+        self.raw.columns = self.raw.columns.map(self._strip_prefix)
+        if self.meta is None:
+            self.meta = Product(self.product)
         self.layers = {
             k: v for k, v in self.meta.layers.items() if k in self.raw.columns
         }
@@ -49,100 +69,337 @@ class Cleaner:
             self.layers.update(tmp)
 
         self.layers = {k: v for k, v in self.layers.items() if not v.IsQA}
+        self.qa_layers = {}
+        if self.quality is not None:
+            for k, v in self.layers.items():
+                qa = [
+                    x
+                    for x in quality_layer_names(v)
+                    if x in self.quality.rules and x in self.raw.columns
+                ]
+                if qa:
+                    self.qa_layers[k] = qa
+        if not self.stream:
+            self.raw = self._read_csv()
+
+    def _strip_prefix(self, col: str) -> str:
+        return col.replace(f"{self.product.replace('.', '_')}_", "")
 
     def clean(self) -> pd.DataFrame:
         """Removes invalid data and fills with NA. Pivots from wide to long format.
 
+        All layers are masked at once on a single numpy block, using vectors of each
+        layer's ValidMin, ValidMax and FillValue, and melted into a long layout allocated
+        up front. Element and units are categoricals, with units attached through the
+        element codes rather than a per-row lookup.
+
         Returns:
             pd.DataFrame: DataFrame of cleaned data.
         """
+        if self.stream:
+            return _concat_cleaned(list(self.iter_clean()))
         logger.info("Cleaning {f}", f=self.f)
-        dat = self.raw[["ID", "Date"] + list(self.layers.keys())]
+        return self._clean_frame(self.raw)
+
+    def iter_clean(
+        self, memory_budget: int = DEFAULT_MEMORY_BUDGET
+    ) -> Iterator[pd.DataFrame]:
+        """Read and clean the .csv in chunks of rows, yielding each cleaned chunk.
+
+        Only the ID, Date and layer columns are read, and the number of rows per chunk is
+        chosen so a chunk, once cleaned and reformatted, stays within `memory_budget`.
+        Every row of an AppEEARS .csv is a single station and date, so sub-daily layers
+        are still aggregated correctly within a chunk.
+
+        Args:
+            memory_budget (int, optional): Approximate bytes of memory a chunk may use. Defaults to 256 MiB.
+
+        Yields:
+            pd.DataFrame: Cleaned chunks in the format returned by `clean`.
+        """
+        chunksize = self._chunk_rows(memory_budget)
+        logger.info("Cleaning {f} in chunks of {n} rows", f=self.f, n=chunksize)
+        with self._read_csv(chunksize=chunksize) as reader:
+            for raw in reader:
+                yield self._clean_frame(raw.rename(columns=self._strip_prefix))
+
+    def _read_csv(self, **kwargs):
+        """Read the ID, Date and layer columns of the .csv with explicit dtypes.
 
-        for k, v in self.layers.items():
-            dat.loc[dat[k] > v.ValidMax, k] = np.nan
-            dat.loc[dat[k] < v.ValidMin, k] = np.nan
-            dat.loc[dat[k] == v.FillValue, k] = np.nan
+        Whole and chunked reads both use pandas' C parser, so a value is parsed to the same
+        float however the file is read and matches observations already in the database.
+        """
+        keep = set(["ID", "Date"] + list(self.layers.keys()))
+        keep.update(x for qa in self.qa_layers.values() for x in qa)
+        columns = {}
+        for col in pd.read_csv(self.f, nrows=0).columns:
+            name = self._strip_prefix(col)
+            if name in keep:
+                columns[col] = "category" if name in ("ID", "Date") else "float64"
+        raw = pd.read_csv(self.f, usecols=list(columns), dtype=columns, **kwargs)
+        if "chunksize" in kwargs:
+            return raw
+        return raw.rename(columns=self._strip_prefix)
 
-        dat = dat.pivot_longer(index=["ID", "Date"], names_to="element")
+    def _chunk_rows(self, memory_budget: int) -> int:
+        """Number of .csv rows whose cleaned cells fit in `memory_budget` bytes."""
+        return max(1, memory_budget // (len(self.layers) * BYTES_PER_CELL))
 
+    def _clean_frame(self, raw: pd.DataFrame) -> pd.DataFrame:
+        names = list(self.layers.keys())
+        layers = list(self.layers.values())
+        vals = raw[names].to_numpy(dtype="float64")
+        if not vals.flags.writeable:
+            # to_numpy can return a read-only view of the frame's data, which is masked in place.
+            vals = vals.copy()
+        vals = self._mask_invalid(vals, layers, self._failed_quality(raw, names))
+
+        hours = None
         if self.is_subdaily:
-            dat = self._clean_subdaily(dat)
+            names, hours = self._split_subdaily(names)
+            if self.to_daily:
+                vals, names = self._daily_means(vals, names)
+                hours = None
+
+        # Several columns share an element when sub-daily hours are kept.
+        col_codes, elements = pd.factorize(np.asarray(names, dtype=object))
 
-        dat = dat.assign(product=self.product)
+        # Column-major ravel stacks each column's rows one after another.
+        n, k = vals.shape
+        element_codes = np.repeat(col_codes.astype("int32"), n)
+        if hours is None:
+            dates = self._tile(raw["Date"], k)
+        else:
+            # Each distinct date is parsed once and offset by the hour of its column.
+            days = raw["Date"].astype("category")
+            parsed = pd.to_datetime(days.cat.categories).to_numpy()
+            days = parsed[days.cat.codes.to_numpy()]
+            step = 24 // len(np.unique(hours))
+            offsets = np.repeat(hours * step, n).astype("timedelta64[h]")
+            dates = np.tile(days, k) + offsets
+        dat = pd.DataFrame(
+            {
+                "ID": self._tile(raw["ID"], k),
+                "Date": dates,
+                "element": pd.Categorical.from_codes(
+                    element_codes, categories=elements
+                ),
+                "value": vals.ravel(order="F"),
+            }
+        )
+
+        dat = dat.assign(
+            product=pd.Categorical.from_codes(
+                np.zeros(len(dat), dtype="int8"), categories=[self.product]
+            )
+        )
 
-        unit_map = {k: v.Units for k, v in self.layers.items()}
-        dat = dat.assign(units=dat["element"])
-        dat = dat.replace({"units": unit_map})
+        # As before, elements that aren't a layer of the file (the daily means of sub-daily
+        # layers) keep their element name as units.
+        units = pd.Index(
+            [self.layers[x].Units if x in self.layers else x for x in elements]
+        )
+        unit_categories = units.dropna().unique()
+        unit_codes = unit_categories.get_indexer(units)
+        dat = dat.assign(
+            units=pd.Categorical.from_codes(
+                unit_codes[element_codes], categories=unit_categories
+            )
+        )
 
         return dat
 
-    @staticmethod
-    def _clean_subdaily(dat: pd.DataFrame, to_daily: bool = True) -> pd.DataFrame:
-        """Cleans subdaily data as they are formatted rather strangely by AppEEARS. Can optionally aggregate to daily means.
+    def _failed_quality(
+        self, raw: pd.DataFrame, names: List[str]
+    ) -> Optional[np.ndarray]:
+        """Decode the QA layers and flag the observations of each column that fail the quality policy.
+
+        Each QA layer is decoded once, however many science layers refer to it.
 
         Args:
-            dat (pd.DataFrame): DataFrame of sub-daily AppEEARS data.
-            to_daily (bool, optional): Wheteher or not to aggregate the data to a daily mean. Defaults to True.
+            raw (pd.DataFrame): The .csv data, with the QA columns.
+            names (List[str]): The science layer of each column to check.
 
         Returns:
-            pd.DataFrame: Cleaned sub-daily dataframe.
+            Optional[np.ndarray]: Boolean array with one column per name that is True where the observation
+            failed, or None if no QA layers are checked.
         """
-        dat = dat.assign(spl=dat.element.str.split("_"))
-        dat = dat.assign(hour=dat.spl.str[-1])
-        dat = dat.assign(element=dat.spl.str[:-1].str.join("_"))
-        dat = dat.drop(columns="spl")
-
-        if to_daily:
-            dat = (
-                dat.groupby_agg(
-                    by=["ID", "Date", "element"],
-                    agg="mean",
-                    agg_column_name="value",
-                    new_column_name="value",
-                    dropna=True,
-                )
-                .drop(columns="hour")
-                .drop_duplicates()
-                .reset_index(drop=True)
-            )
-            return dat
+        if not self.qa_layers:
+            return None
+        passes = {
+            qa: self.quality.passes(qa, raw[qa].to_numpy(dtype="float64"))
+            for qa in set(x for qa in self.qa_layers.values() for x in qa)
+        }
+        failed = np.zeros((len(raw), len(names)), dtype=bool)
+        for j, name in enumerate(names):
+            for qa in self.qa_layers.get(name, []):
+                failed[:, j] |= ~passes[qa]
+        return failed
 
-        hours = set([int(x) for x in dat.hour.to_list()])
-        hours = int(24 / len(hours))
-        dat = dat.assign(hour=dat.hour * hours)
-        dat = dat.deconcatenate_column(
-            "Date", "-", new_column_names=["year", "month", "day"]
+    @staticmethod
+    def _tile(col: pd.Series, k: int) -> pd.Categorical:
+        """Repeat a column k times end to end as a categorical, copying only its integer codes."""
+        col = col.astype("category")
+        return pd.Categorical.from_codes(
+            np.tile(col.cat.codes.to_numpy(), k), categories=col.cat.categories
         )
-        dat = dat.assign(
-            Date=pd.to_datetime(
-                dict(year=dat.year, month=dat.month, day=dat.day, hour=dat.hour)
-            )
+
+    @staticmethod
+    def _mask_invalid(
+        vals: np.ndarray, layers: List[Layer], failed: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Set values outside each layer's valid range, equal to its fill value, or that failed QA, to NaN.
+
+        Args:
+            vals (np.ndarray): 2D array with one column per layer.
+            layers (List[Layer]): The layer of each column.
+            failed (Optional[np.ndarray], optional): Boolean array the shape of `vals` that is True where an
+                observation failed quality checks. Defaults to None.
+
+        Returns:
+            np.ndarray: The same array, masked in place.
+        """
+        valid_min = np.array([x.ValidMin for x in layers], dtype="float64")
+        valid_max = np.array([x.ValidMax for x in layers], dtype="float64")
+        fill = np.array([x.FillValue for x in layers], dtype="float64")
+        invalid = (vals > valid_max) | (vals < valid_min) | (vals == fill)
+        if failed is not None:
+            invalid |= failed
+        vals[invalid] = np.nan
+        return vals
+
+    @staticmethod
+    def _split_subdaily(names: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Split sub-daily column names, formatted as {layer}_{hour}, into their layer and hour.
+
+        Args:
+            names (List[str]): Sub-daily column names.
+
+        Returns:
+            Tuple[List[str], np.ndarray]: The layer of each column and the hour index of each column.
+        """
+        parts = [x.rsplit("_", 1) for x in names]
+        return [x[0] for x in parts], np.array([int(x[1]) for x in parts])
+
+    @staticmethod
+    def _daily_means(
+        vals: np.ndarray, layers: List[str]
+    ) -> Tuple[np.ndarray, List[str]]:
+        """Average the sub-daily columns of each layer into a daily mean, ignoring NaNs.
+
+        Columns are grouped by layer and summed in a single reduction over each group's
+        slice, so the wide array is reduced before it is reshaped to long format.
+
+        Args:
+            vals (np.ndarray): 2D array with one column per layer and hour.
+            layers (List[str]): The layer of each column.
+
+        Returns:
+            Tuple[np.ndarray, List[str]]: The daily means, with one column per layer, and the layer of each column.
+        """
+        codes, uniques = pd.factorize(np.asarray(layers, dtype=object))
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+        vals = vals[:, order]
+        valid = ~np.isnan(vals)
+        sums = np.add.reduceat(np.where(valid, vals, 0.0), starts, axis=1)
+        counts = np.add.reduceat(valid.astype("int32"), starts, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return means, list(uniques)
+
+
+def _product_name(f: Path) -> str:
+    """Get the product name, formatted as NAMEOFPRODUCT.XXX, from an AppEEARS .csv filename."""
+    parts = f.stem.split("-")
+    return f"{parts[-3]}.{parts[-2]}"
+
+
+def _clean_file(
+    f: Path, meta: Product, quality: Optional[QualityPolicy] = None
+) -> pd.DataFrame:
+    c = Cleaner(f, is_subdaily="SPL4SMGP" in f.stem, meta=meta, quality=quality)
+    return c.clean()
+
+
+def _concat_cleaned(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate cleaned dataframes, unifying their categories first so the columns stay categoricals."""
+    for col in CATEGORICAL_COLUMNS:
+        dfs = [df.assign(**{col: df[col].astype("category")}) for df in dfs]
+        categories = pd.Index([])
+        for df in dfs:
+            categories = categories.union(df[col].cat.categories)
+        dfs = [df.assign(**{col: df[col].cat.set_categories(categories)}) for df in dfs]
+    return pd.concat(dfs, axis=0, ignore_index=True)
+
+
+def iter_clean_all(
+    dirname: Union[str, Path],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    quality: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """Clean all of the AppEEARS .csv files in a directory, one bounded-size chunk at a time.
+
+    Args:
+        dirname (Union[str, Path]): Directory containing the files to clean.
+        memory_budget (int, optional): Approximate bytes of memory a chunk may use. Defaults to 256 MiB.
+        quality (bool, optional): Whether to mask observations that fail the product's default QA policy. Defaults to False.
+
+    Yields:
+        pd.DataFrame: Cleaned chunks, file by file in sorted order.
+    """
+    dirname = dirname if isinstance(dirname, Path) else Path(dirname)
+    products = {}
+    for f in sorted(dirname.iterdir()):
+        name = _product_name(f)
+        if name not in products:
+            products[name] = Product(name)
+        c = Cleaner(
+            f,
+            is_subdaily="SPL4SMGP" in f.stem,
+            meta=products[name],
+            stream=True,
+            quality=DEFAULT_POLICIES.get(name) if quality else None,
         )
-        dat = dat.drop(columns=["hour", "year", "month", "day"])
-        return dat
+        yield from c.iter_clean(memory_budget)
 
 
 def clean_all(
-    dirname: Union[str, Path], save: Optional[Union[str, Path]] = None
+    dirname: Union[str, Path],
+    save: Optional[Union[str, Path]] = None,
+    workers: int = 1,
+    quality: bool = False,
 ) -> pd.DataFrame:
     """Clean all of the AppEEARS .csv files in a directory and combine them into a single dataframe.
 
+    Product metadata is fetched once per product and handed to each Cleaner, so worker
+    processes don't query AppEEARS. Files are cleaned in sorted order, and the result
+    doesn't depend on the number of workers.
+
     Args:
         dirname (Union[str, Path]): Directory containing the files to clean.
         save (Optional[Union[str, Path]], optional): Pathname to save file to. If left as none, the file is not saved, but the dataframe is returned. Defaults to None.
+        workers (int, optional): Number of processes to clean files in. Defaults to 1, which cleans them in this process.
+        quality (bool, optional): Whether to mask observations that fail the product's default QA policy. Defaults to False.
 
     Returns:
         pd.DataFrame: DataFrame of combined and cleaned data.
     """
     dirname = dirname if isinstance(dirname, Path) else Path(dirname)
-    dfs = []
-    for f in dirname.iterdir():
-        subdaily = "SPL4SMGP" in f.stem
-        c = Cleaner(f, is_subdaily=subdaily)
-        tmp = c.clean()
-        dfs.append(tmp)
-    dat = pd.concat(dfs, axis=0)
+    files = sorted(dirname.iterdir())
+    products = {x: Product(x) for x in sorted(set(_product_name(f) for f in files))}
+    metas = [products[_product_name(f)] for f in files]
+    policies = [
+        DEFAULT_POLICIES.get(_product_name(f)) if quality else None for f in files
+    ]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            dfs = list(executor.map(_clean_file, files, metas, policies))
+    else:
+        dfs = [_clean_file(*x) for x in zip(files, metas, policies)]
+
+    dat = _concat_cleaned(dfs)
     if save:
         dat.to_csv(save, index=False)
     return dat
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+
+@dataclass
+class IdIndex:
+    """Local set of the observation ids already stored in the database.
+
+    Ids are kept as a sorted array of their 64-bit hashes, so membership checks are a
+    vectorised binary search and millions of ids fit in a few tens of megabytes.
+
+    Attributes:
+        path (Optional[Union[str, Path]]): .npy file the index is loaded from and saved to. If None, the index is only kept in memory.
+        hashes (np.ndarray): Sorted, unique uint64 hashes of the stored ids. Loaded from `path` if it exists.
+    """
+
+    path: Optional[Union[str, Path]] = None
+    hashes: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.path = Path(self.path) if self.path is not None else None
+        if self.path is not None and self.path.exists():
+            self.hashes = np.load(self.path)
+            logger.info(f"Loaded {len(self)} existing ids from {self.path}.")
+        else:
+            self.hashes = np.empty(0, dtype="uint64")
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @staticmethod
+    def hash_ids(ids: Iterable) -> np.ndarray:
+        """Hash observation ids to stable 64-bit integers.
+
+        pd.util.hash_array hashes an int64 array differently from an object array of the
+        same ints, so integer ids are always hashed as int64 and anything else as strings.
+
+        Args:
+            ids (Iterable): Observation ids.
+
+        Returns:
+            np.ndarray: uint64 hash of each id.
+        """
+        ids = np.asarray(ids)
+        if ids.dtype.kind in "iu" or (
+            ids.dtype.kind == "O" and pd.api.types.infer_dtype(ids) == "integer"
+        ):
+            return pd.util.hash_array(ids.astype("int64"))
+        return pd.util.hash_array(ids.astype(str).astype(object))
+
+    def contains(self, ids: Iterable) -> np.ndarray:
+        """Check which ids are already in the index.
+
+        Args:
+            ids (Iterable): Observation ids.
+
+        Returns:
+            np.ndarray: Boolean mask that is True where the id is already stored.
+        """
+        return self._contains_hashes(self.hash_ids(ids))
+
+    def _contains_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        if len(self.hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(self.hashes, hashes)
+        pos[pos == len(self.hashes)] = 0
+        return self.hashes[pos] == hashes
+
+    def add(self, ids: Iterable):
+        """Add newly written ids to the index.
+
+        Args:
+            ids (Iterable): Observation ids.
+        """
+        hashes = np.unique(self.hash_ids(ids))
+        hashes = hashes[~self._contains_hashes(hashes)]
+        self.hashes = np.insert(
+            self.hashes, np.searchsorted(self.hashes, hashes), hashes
+        )
+
+    def save(self):
+        """Write the index to `path`, replacing the previous file in a single step."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.hashes)
+        os.replace(tmp, self.path)
+
+    def is_stale(self, conn) -> bool:
+        """Check whether the index no longer matches the database.
+
+        The index holds one hash per stored observation, so a different count means the
+        database was restored, rebuilt or written to without it.
+
+        Args:
+            conn (MesonetSatelliteDB): Connection to the Neo4j database.
+
+        Returns:
+            bool: True if the index should be rebuilt.
+        """
+        stored = conn.count_ids()
+        if len(self) != stored:
+            logger.info(
+                f"Id index has {len(self)} ids but the database has {stored} observations."
+            )
+            return True
+        return False
+
+    def build(self, conn, chunk_size: int = 1000000) -> IdIndex:
+        """Rebuild the index from every observation id in the database.
+
+        Args:
+            conn (MesonetSatelliteDB): Connection to the Neo4j database.
+            chunk_size (int, optional): Number of ids to read from the database at a time. Defaults to 1000000.
+
+        Returns:
+            IdIndex: The rebuilt index.
+        """
+        parts = [self.hash_ids(ids) for ids in conn.iter_ids(chunk_size)]
+        self.hashes = (
+            np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype="uint64")
+        )
+        self.save()
+        logger.info(f"Built index of {len(self)} existing ids.")
+        return self
@@ -0,0 +1,187 @@
+import os
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+from loguru import logger
+
+from .Backend import QUERY_COLUMNS, StorageBackend
+from .to_db_format import find_init_files
+
+STORE_COLUMNS = ["id", "timestamp", "platform", "value", "units"]
+
+
+class LocalSatelliteDB(StorageBackend):
+    def __init__(self, root: Union[str, Path]) -> None:
+        """Initialize a satellite observation store backed by local Parquet files.
+
+        Observations are stored as one Parquet file per station and element, at
+        root/{station}/{element}.parquet, sorted by timestamp. Reading a series is a single
+        file read, and nothing needs to be running besides this process. Requires pyarrow.
+
+        Args:
+            root (Union[str, Path]): Directory to keep the Parquet files in. Created if it doesn't exist.
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def close(self):
+        """Nothing to close, the files are only open while they are read or written."""
+
+    def init_db(self, f_dir: Union[str, Path], **kwargs):
+        """Load the 'data_init' files produced by to_db_format into the store.
+
+        Args:
+            f_dir (Union[str, Path]): The directory with the 'data_init' files to load.
+        """
+        for f in find_init_files(f_dir):
+            self.post(pd.read_csv(f))
+
+    def _path(self, station: str, element: str) -> Path:
+        return self.root / station / f"{element}.parquet"
+
+    def _read(self, station: str, element: str, **kwargs) -> pd.DataFrame:
+        f = self._path(station, element)
+        if not f.exists():
+            return pd.DataFrame(columns=STORE_COLUMNS)
+        return pd.read_parquet(f, **kwargs)
+
+    def query(
+        self, station: str, start_time: int, end_time: int, element: str
+    ) -> pd.DataFrame:
+        """Query satellite observations of one element at a station.
+
+        Args:
+            station (str): The name of the Montana Mesonet station to query.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            element (str): The satellite indicator to gather data for.
+
+        Returns:
+            pd.DataFrame: A dataframe of the data returned from the query.
+        """
+        dat = self._read(
+            station,
+            element,
+            filters=[("timestamp", ">=", start_time), ("timestamp", "<=", end_time)],
+        )
+        if len(dat) == 0:
+            logger.warning("No available data for this query.")
+            return pd.DataFrame()
+
+        dat = dat.rename(columns={"timestamp": "date"})
+        dat = dat.assign(station=station, element=element)
+        return dat[QUERY_COLUMNS].reset_index(drop=True)
+
+    def query_many(
+        self,
+        stations: List[str],
+        elements: List[str],
+        start_time: int,
+        end_time: int,
+        wide: bool = False,
+    ) -> pd.DataFrame:
+        """Query several stations and elements at once.
+
+        Args:
+            stations (List[str]): The names of the Montana Mesonet stations to query.
+            elements (List[str]): The satellite indicators to gather data for.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            wide (bool, optional): Whether to pivot the result so each element is its own column. Defaults to False.
+
+        Returns:
+            pd.DataFrame: A long-format dataframe with the same columns as `query`, or a wide dataframe
+            indexed by station, date and platform with one column per element if `wide` is True.
+        """
+        dfs = []
+        for station in sorted(stations):
+            for element in sorted(elements):
+                if self._path(station, element).exists():
+                    dfs.append(self.query(station, start_time, end_time, element))
+        dfs = [x for x in dfs if len(x)]
+        if dfs:
+            dat = pd.concat(dfs, ignore_index=True)
+        else:
+            logger.warning("No available data for this query.")
+            dat = pd.DataFrame(columns=QUERY_COLUMNS)
+
+        if wide:
+            dat = self._pivot_wide(dat)
+
+        return dat
+
+    def post(self, dat: pd.DataFrame, batch_size: int = 5000):
+        """Merge observations into their station/element files.
+
+        Observations whose id is already stored are skipped, matching the unique id
+        constraint of the Neo4j database.
+
+        Args:
+            dat (pd.DataFrame): Satellite data reformatted using the to_db_format function.
+            batch_size (int, optional): Unused, each station/element file is rewritten once. Defaults to 5000.
+        """
+        n = 0
+        groups = dat.groupby(["station", "element"], sort=False, observed=True)
+        for (station, element), tmp in groups:
+            existing = self._read(station, element)
+            tmp = tmp[STORE_COLUMNS].astype(
+                {
+                    "timestamp": "int64",
+                    "value": "float64",
+                    "platform": object,
+                    "units": object,
+                }
+            )
+            if len(existing):
+                merged = pd.concat([existing, tmp], ignore_index=True)
+            else:
+                merged = tmp.reset_index(drop=True)
+            merged = merged.drop_duplicates(subset="id", keep="first")
+            merged = merged.sort_values("timestamp", ignore_index=True)
+            n += len(merged) - len(existing)
+
+            f = self._path(station, element)
+            f.parent.mkdir(parents=True, exist_ok=True)
+            tmp_f = f.with_suffix(".tmp")
+            merged.to_parquet(tmp_f, index=False)
+            os.replace(tmp_f, f)
+
+        logger.info(f"Wrote {n} new observations to {self.root}.")
+
+    def _series_bounds(self) -> pd.DataFrame:
+        """Get the earliest and latest timestamp of every station/platform/element series."""
+        dfs = []
+        for f in self.root.glob("*/*.parquet"):
+            tmp = pd.read_parquet(f, columns=["timestamp", "platform"])
+            tmp = tmp.groupby("platform")["timestamp"].agg(["min", "max"]).reset_index()
+            dfs.append(tmp.assign(station=f.parent.name, element=f.stem))
+        if not dfs:
+            return pd.DataFrame(
+                columns=["platform", "min", "max", "station", "element"]
+            )
+        return pd.concat(dfs, ignore_index=True)
+
+    def get_latest(self) -> pd.DataFrame:
+        """Get the most recent timestamp of each platform and element across all stations.
+
+        Returns:
+            pd.DataFrame: A dataframe with 'date', 'platform' and 'element' columns.
+        """
+        dat = self._series_bounds().groupby(["platform", "element"])["max"].max()
+        return self._format_bounds(dat)
+
+    def get_earliest(self) -> pd.DataFrame:
+        """Get the oldest timestamp of each platform and element across all stations.
+
+        Returns:
+            pd.DataFrame: A dataframe with 'date', 'platform' and 'element' columns.
+        """
+        dat = self._series_bounds().groupby(["platform", "element"])["min"].min()
+        return self._format_bounds(dat)
+
+    @staticmethod
+    def _format_bounds(dat: pd.Series) -> pd.DataFrame:
+        dat = dat.rename("date").reset_index().sort_values("date", ignore_index=True)
+        dat = dat.assign(date=pd.to_datetime(dat.date, unit="s"))
+        return dat[["date", "platform", "element"]]
@@ -1,44 +1,734 @@
+import json
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Union
+from typing import Any, Dict, Iterator, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 from loguru import logger
-from neo4j.exceptions import ConstraintError
+from neo4j.exceptions import ConstraintError, TransientError
 
-from neo4j import GraphDatabase
+from neo4j import READ_ACCESS, GraphDatabase
 
+from .Backend import QUERY_COLUMNS, StorageBackend
+from .Cache import QueryCache
+from .IdIndex import IdIndex
+from .to_db_format import find_init_files, observation_ids
 
-class MesonetSatelliteDB:
-    def __init__(self, uri: str, user: str, password: str) -> None:
+# Cypher statements shared by the synchronous and asynchronous connections.
+# Each station/platform/element series has a Watermark node holding its earliest and
+# latest timestamps. The write path keeps them current so the update does not need to
+# scan every OBSERVES relationship to find where each product left off.
+GET_LATEST = (
+    "MATCH (w:Watermark) "
+    "RETURN MAX(w.latest) as time, w.platform as platform, w.element as element "
+    "ORDER BY time"
+)
+
+GET_EARLIEST = (
+    "MATCH (w:Watermark) "
+    "RETURN MIN(w.earliest) as time, w.platform as platform, w.element as element "
+    "ORDER BY time"
+)
+
+GET_LATEST_SCAN = """
+    MATCH (s:Station)-[o:OBSERVES]->(obs:Observation)\n
+    RETURN MAX(o.timestamp) as time, obs.platform as platform, obs.element as element\n
+    ORDER BY time
+    """
+
+# Watermarks only cover every series once they have been built from the whole database,
+# by init_db or rebuild_watermarks, or the database was empty when they started being kept.
+# That is recorded by a Migration node, and until it exists reads scan the observations.
+HAS_WATERMARKS = "MATCH (m:Migration {name: 'watermarks'}) RETURN count(m) > 0"
+
+MARK_WATERMARKS = "MERGE (m:Migration {name: 'watermarks'}) SET m.applied = timestamp()"
+
+MARK_WATERMARKS_IF_EMPTY = (
+    "MATCH (obs:Observation) WITH count(obs) AS observations "
+    "OPTIONAL MATCH (c:Chunk) WITH observations, count(c) AS chunks "
+    "WHERE observations + chunks = 0 "
+    "MERGE (m:Migration {name: 'watermarks'}) SET m.applied = timestamp()"
+)
+
+UPDATE_WATERMARKS = (
+    "UNWIND $rows AS row "
+    "WITH row.station AS station, row.platform AS platform, row.element AS element, "
+    "MIN(toInteger(row.timestamp)) AS earliest, MAX(toInteger(row.timestamp)) AS latest "
+    "MERGE (w:Watermark {station: station, platform: platform, element: element}) "
+    "ON CREATE SET w.earliest = earliest, w.latest = latest "
+    "ON MATCH SET w.earliest = CASE WHEN earliest < w.earliest THEN earliest ELSE w.earliest END, "
+    "w.latest = CASE WHEN latest > w.latest THEN latest ELSE w.latest END"
+)
+
+REBUILD_WATERMARKS = [
+    "MATCH (w:Watermark) DELETE w",
+    "MATCH (s:Station)-[o:OBSERVES]->(obs:Observation) "
+    "WITH s.name AS station, obs.platform AS platform, obs.element AS element, "
+    "MIN(o.timestamp) AS earliest, MAX(o.timestamp) AS latest "
+    "CREATE (:Watermark {station: station, platform: platform, element: element, earliest: earliest, latest: latest})",
+    MARK_WATERMARKS,
+]
+
+# The platform and element of each observation are copied onto its OBSERVES relationship
+# so queries can be answered from the relationship property indexes without visiting
+# every Observation node of a station.
+POST_DATA = (
+    "MERGE (s:Station {name: $station}) "
+    "MERGE (o:Observation {id: $id, platform: $platform, element: $element, value: $value, units: $units}) "
+    "MERGE (s)-[r:OBSERVES{timestamp: toInteger($timestamp)}]->(o) "
+    "SET r.element = $element, r.platform = $platform;"
+)
+
+POST_BATCH = (
+    "UNWIND $rows AS row "
+    "MERGE (s:Station {name: row.station}) "
+    "MERGE (o:Observation {id: row.id, platform: row.platform, element: row.element, value: row.value, units: row.units}) "
+    "MERGE (s)-[r:OBSERVES{timestamp: toInteger(row.timestamp)}]->(o) "
+    "SET r.element = row.element, r.platform = row.platform;"
+)
+
+QUERY = (
+    "MATCH (s:Station {name: $station})-[o:OBSERVES]->(obs:Observation) "
+    "WHERE o.element = $element and o.timestamp >= $start_time and o.timestamp <= $end_time "
+    "RETURN s.name, o.timestamp, o.platform, o.element, obs.value, obs.units "
+    "ORDER BY o.timestamp, o.platform"
+)
+
+QUERY_MANY = (
+    "MATCH (s:Station)-[o:OBSERVES]->(obs:Observation) "
+    "WHERE o.element IN $elements and o.timestamp >= $start_time and o.timestamp <= $end_time and s.name IN $stations "
+    "RETURN s.name, o.timestamp, o.platform, o.element, obs.value, obs.units "
+    "ORDER BY s.name, o.element, o.timestamp, o.platform"
+)
+
+INIT_INDEX = [
+    "CREATE INDEX observesTimestampIndex IF NOT EXISTS "
+    "FOR ()-[o:OBSERVES]-() ON (o.timestamp); ",
+    "CREATE INDEX observesElementIndex IF NOT EXISTS "
+    "FOR ()-[o:OBSERVES]-() ON (o.element, o.timestamp); ",
+    "CREATE INDEX observesPlatformIndex IF NOT EXISTS "
+    "FOR ()-[o:OBSERVES]-() ON (o.platform); ",
+    "CREATE CONSTRAINT obsIdConstraint IF NOT EXISTS "
+    "FOR (obs:Observation) "
+    "REQUIRE obs.id IS UNIQUE; ",
+    "CREATE CONSTRAINT stationConstraint IF NOT EXISTS "
+    "FOR (s:Station) "
+    "REQUIRE s.name IS UNIQUE; ",
+    "CREATE INDEX watermarkIndex IF NOT EXISTS "
+    "FOR (w:Watermark) ON (w.station, w.platform, w.element); ",
+]
+
+# Earlier versions declared this as a node index on an 'OBSERVES' label, which no query uses.
+DROP_LEGACY_INDEX = "DROP INDEX timestampIndex IF EXISTS"
+
+# Must run in an auto-commit transaction, since it commits its own batches.
+MIGRATE_OBSERVES = (
+    "MATCH (:Station)-[o:OBSERVES]->(obs:Observation) "
+    "WHERE o.element IS NULL "
+    "CALL {{ WITH o, obs SET o.element = obs.element, o.platform = obs.platform }} "
+    "IN TRANSACTIONS OF {batch_size} ROWS"
+)
+
+INIT_STATIONS = (
+    "LOAD CSV WITH HEADERS FROM $f_path AS line "
+    "WITH DISTINCT line.station AS name "
+    "MERGE (:Station {name: name})"
+)
+
+# Must run in an auto-commit transaction, since it commits its own batches. MERGE on the
+# unique id makes a retried or repeated load of the same file a no-op for rows already written.
+# {id} is line.id, or toInteger(line.id) for compact ids.
+INIT_DB = (
+    "LOAD CSV WITH HEADERS FROM $f_path AS line "
+    "CALL {{ "
+    "WITH line "
+    "MATCH (station:Station {{name: line.station}}) "
+    "MERGE (obs:Observation {{id: {id}}}) "
+    "ON CREATE SET obs.platform = line.platform, obs.element = line.element, obs.value = toFloat(line.value), obs.units = toString(line.units) "
+    "MERGE (station)-[:OBSERVES {{timestamp: toInteger(line.timestamp), element: line.element, platform: line.platform}}]->(obs) "
+    "}} IN TRANSACTIONS OF {batch_size} ROWS"
+)
+
+# With schema="chunk", each station/platform/element/year series is stored as a single
+# Chunk node holding parallel, time-sorted timestamp and value arrays.
+GET_CHUNKS = (
+    "UNWIND $keys AS key "
+    "MATCH (c:Chunk {station: key.station, platform: key.platform, element: key.element, year: key.year}) "
+    "RETURN c.station, c.platform, c.element, c.year, c.timestamps, c.values"
+)
+
+POST_CHUNKS = (
+    "UNWIND $chunks AS chunk "
+    "MERGE (s:Station {name: chunk.station}) "
+    "MERGE (c:Chunk {station: chunk.station, platform: chunk.platform, element: chunk.element, year: chunk.year}) "
+    "SET c.units = chunk.units, c.timestamps = chunk.timestamps, c.values = chunk.values "
+    "MERGE (s)-[:HAS_CHUNK]->(c);"
+)
+
+QUERY_CHUNKS = (
+    "MATCH (s:Station)-[:HAS_CHUNK]->(c:Chunk) "
+    "WHERE s.name IN $stations and c.element IN $elements and c.year >= $start_year and c.year <= $end_year "
+    "RETURN c.station, c.platform, c.element, c.units, c.timestamps, c.values "
+    "ORDER BY c.station, c.element, c.year, c.platform"
+)
+
+INIT_CHUNK_INDEX = [
+    "CREATE INDEX chunkIndex IF NOT EXISTS "
+    "FOR (c:Chunk) ON (c.station, c.element, c.year); ",
+]
+
+REBUILD_CHUNK_WATERMARKS = [
+    "MATCH (w:Watermark) DELETE w",
+    "MATCH (c:Chunk) "
+    "WITH c.station AS station, c.platform AS platform, c.element AS element, "
+    "MIN(c.timestamps[0]) AS earliest, MAX(c.timestamps[-1]) AS latest "
+    "CREATE (:Watermark {station: station, platform: platform, element: element, earliest: earliest, latest: latest})",
+    MARK_WATERMARKS,
+]
+
+# Number of stored observations, used to tell whether a local IdIndex still matches the database.
+COUNT_IDS = "MATCH (obs:Observation) RETURN count(obs)"
+
+COUNT_CHUNK_IDS = "MATCH (c:Chunk) RETURN coalesce(sum(size(c.timestamps)), 0)"
+
+# Observations that still have a string id, found by the station prefix of the id.
+LIST_STRING_IDS = (
+    "MATCH (s:Station)-[o:OBSERVES]->(obs:Observation) "
+    "WHERE obs.id STARTS WITH s.name "
+    "RETURN obs.id AS id, s.name AS station, o.timestamp AS timestamp, obs.platform AS platform, obs.element AS element"
+)
+
+UPDATE_IDS = (
+    "UNWIND $rows AS row "
+    "MATCH (obs:Observation {id: row.old}) "
+    "SET obs.id = row.new"
+)
+
+LIST_STATIONS = "MATCH (s:Station) RETURN s.name ORDER BY s.name"
+
+LIST_SERIES = (
+    "MATCH (w:Watermark) "
+    "RETURN w.station AS station, w.element AS element, MAX(w.latest) AS latest "
+    "ORDER BY station, element"
+)
+
+# Reads that answer the same questions as GET_LATEST, GET_EARLIEST and LIST_SERIES by
+# scanning every observation, for databases whose watermarks aren't complete yet.
+WATERMARK_SCANS = {
+    "observation": {
+        "latest": GET_LATEST_SCAN,
+        "earliest": (
+            "MATCH (s:Station)-[o:OBSERVES]->(obs:Observation) "
+            "RETURN MIN(o.timestamp) as time, obs.platform as platform, obs.element as element "
+            "ORDER BY time"
+        ),
+        "series": (
+            "MATCH (s:Station)-[o:OBSERVES]->(obs:Observation) "
+            "RETURN s.name AS station, obs.element AS element, MAX(o.timestamp) AS latest "
+            "ORDER BY station, element"
+        ),
+    },
+    "chunk": {
+        "latest": (
+            "MATCH (c:Chunk) "
+            "RETURN MAX(c.timestamps[-1]) as time, c.platform as platform, c.element as element "
+            "ORDER BY time"
+        ),
+        "earliest": (
+            "MATCH (c:Chunk) "
+            "RETURN MIN(c.timestamps[0]) as time, c.platform as platform, c.element as element "
+            "ORDER BY time"
+        ),
+        "series": (
+            "MATCH (c:Chunk) "
+            "RETURN c.station AS station, c.element AS element, MAX(c.timestamps[-1]) AS latest "
+            "ORDER BY station, element"
+        ),
+    },
+}
+
+# Upper bound for open-ended reads, 2100-01-01.
+MAX_TIMESTAMP = 4102444800
+
+SCHEMAS = ["observation", "chunk"]
+
+
+class MesonetSatelliteDB(StorageBackend):
+    def __init__(
+        self,
+        uri: str,
+        user: str,
+        password: str,
+        max_connection_pool_size: int = 100,
+        connection_acquisition_timeout: float = 60.0,
+        fetch_size: int = 1000,
+        schema: str = "observation",
+        id_index: Optional[IdIndex] = None,
+        cache: Optional[QueryCache] = None,
+        compact_ids: bool = False,
+    ) -> None:
         """Initialize Mesonet Satellite DB object and connect to the Neo4j db.
 
         Args:
             uri (str): The database URI for the Neo4j database.
             user (str): The database Neo4j username.
             password (str): The database Neo4j password.
+            max_connection_pool_size (int, optional): Maximum number of connections the driver keeps open. Defaults to 100.
+            connection_acquisition_timeout (float, optional): Seconds to wait for a free pooled connection before failing. Defaults to 60.0.
+            fetch_size (int, optional): Number of records pulled from the server per batch when reading results. Defaults to 1000.
+            schema (str, optional): How observations are stored. 'observation' stores one Observation node per value,
+                'chunk' stores one Chunk node per station/platform/element/year holding timestamp and value arrays.
+                Defaults to "observation".
+            id_index (Optional[IdIndex], optional): Local index of ids already in the database. If given, `post` drops
+                rows whose id is in the index before writing and adds the ids it writes. Defaults to None.
+            cache (Optional[QueryCache], optional): Cache for `query` results. Writes through `post` and `init_db`
+                invalidate the affected entries. Defaults to None.
+            compact_ids (bool, optional): Whether observations are keyed by compact int64 ids instead of
+                station_timestamp_platform_element strings. See observation_ids and `migrate_to_compact_ids`.
+                Defaults to False.
         """
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        assert schema in SCHEMAS, f"schema must be one of {SCHEMAS}."
+        self.schema = schema
+        self.id_index = id_index
+        self.cache = cache
+        self.compact_ids = compact_ids
+        self.fetch_size = fetch_size
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=connection_acquisition_timeout,
+        )
+        self._local = threading.local()
+        self._has_watermarks = False
 
     def close(self):
         """Close the connection to the Neo4j database."""
         self.driver.close()
 
+    @contextmanager
+    def session(self):
+        """Hold a single session open for a block of batched operations.
+
+        Every public method called inside the block (from the same thread) reuses this
+        session instead of opening its own.
+
+        Example:
+            with conn.session():
+                for station in stations:
+                    conn.query(station, start_time, end_time, "NDVI")
+
+        Yields:
+            neo4j.Session: The shared session.
+        """
+        if getattr(self._local, "session", None) is not None:
+            yield self._local.session
+            return
+
+        with self.driver.session(fetch_size=self.fetch_size) as session:
+            self._local.session = session
+            try:
+                yield session
+            finally:
+                self._local.session = None
+
+    @contextmanager
+    def transaction(self):
+        """Run a block of statements in one explicit write transaction.
+
+        The transaction commits when the block exits cleanly and rolls back if it raises.
+
+        Yields:
+            neo4j.Transaction: The open transaction.
+        """
+        with self.session() as session:
+            with session.begin_transaction() as tx:
+                yield tx
+
     def init_db_indices(self):
-        """Initialize index relationships and unique constraints."""
-        with self.driver.session() as session:
+        """Initialize index relationships and unique constraints.
+
+        On an empty database this also records that watermarks are complete, since `post`
+        and `init_db` keep them current from the first write.
+        """
+        with self.session() as session:
             session.write_transaction(self._init_index)
+            session.write_transaction(self._run, MARK_WATERMARKS_IF_EMPTY)
+            if self.schema == "chunk":
+                session.write_transaction(self._init_chunk_index)
 
-    def init_db(self, f_dir: Union[str, Path], use_path: bool = False):
+    def init_db(
+        self,
+        f_dir: Union[str, Path],
+        use_path: bool = False,
+        batch_size: int = 10000,
+        workers: int = 1,
+        retries: int = 3,
+    ):
         """Initialize the Neo4j database using satellite data derived from the to_db_format.py script.
 
+        Each file is loaded with a single LOAD CSV statement that commits every `batch_size`
+        rows, so files no longer need to be split into small shards. Several files can be
+        loaded at once on separate sessions; shards split by station avoid lock contention
+        between them. A file that fails with a transient error (e.g. a deadlock) is retried,
+        which is safe because rows that were already committed are merged rather than duplicated.
+
+        With schema="chunk", the files are read locally from `f_dir` and written with `post`,
+        since LOAD CSV cannot build the chunk arrays.
+
         Args:
             f_dir (Union[str, Path]): The directory with the 'data_init' files to save to the database.
+            use_path (bool, optional): Load files from their full path instead of the Neo4j import directory. Defaults to False.
+            batch_size (int, optional): Number of rows committed per transaction. Defaults to 10000.
+            workers (int, optional): Number of files to load concurrently. Defaults to 1.
+            retries (int, optional): Number of times to retry a file after a transient error. Defaults to 3.
         """
-        with self.driver.session() as session:
-            # Had to break file into multiple to keep from breaking.
-            for f in Path(f_dir).glob("data_init*"):
-                f_path = str(f) if use_path else f"file:///{f.name}"
-                session.write_transaction(self._init_db, f_path)
+        files = find_init_files(f_dir)
+        if self.cache is not None:
+            # The files may not be readable from here, so the affected series aren't known.
+            self.cache.clear()
+        if self.schema == "chunk":
+            for f in files:
+                self.post(pd.read_csv(f))
+            with self.session() as session:
+                session.write_transaction(self._rebuild_chunk_watermarks)
+            return
+
+        f_paths = [str(f) if use_path else f"file:///{f.name}" for f in files]
+
+        # Create stations up front so concurrent loads only need to MATCH them.
+        with self.session() as session:
+            for f_path in f_paths:
+                session.run(INIT_STATIONS, f_path=f_path).consume()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            n = sum(
+                executor.map(
+                    lambda f_path: self._load_file(f_path, batch_size, retries),
+                    f_paths,
+                )
+            )
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Loaded {n} observations from {len(f_paths)} files in {elapsed:.1f} seconds ({n/elapsed:,.0f} rows/sec)."
+        )
+
+        with self.session() as session:
+            session.write_transaction(self._rebuild_watermarks)
+
+    def _load_file(self, f_path: str, batch_size: int, retries: int) -> int:
+        """Load one to_db_format file with LOAD CSV on its own session and return the number of observations created."""
+        statement = INIT_DB.format(batch_size=int(batch_size), id=self._init_id)
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                with self.driver.session() as session:
+                    summary = session.run(statement, f_path=f_path).consume()
+                break
+            except TransientError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Transient error loading {f_path}, retrying: {e}")
+
+        n = summary.counters.nodes_created
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Loaded {n} observations from {f_path} in {elapsed:.1f} seconds ({n/elapsed:,.0f} rows/sec)."
+        )
+        return n
+
+    @property
+    def _init_id(self) -> str:
+        return "toInteger(line.id)" if self.compact_ids else "line.id"
+
+    def rebuild_watermarks(self):
+        """Recompute every Watermark node from the observations in the database.
+
+        This scans the whole graph, so it only needs to be run once on databases created
+        before watermarks were maintained by `post` and `init_db`. Until it has been run,
+        reads that use watermarks fall back to scanning every observation, since watermarks
+        created by `post` alone would miss the series it hasn't written to.
+        """
+        with self.session() as session:
+            if self.schema == "chunk":
+                session.write_transaction(self._rebuild_chunk_watermarks)
+            else:
+                session.write_transaction(self._rebuild_watermarks)
+        logger.info("Watermarks rebuilt.")
+
+    def migrate_observes_properties(self, batch_size: int = 10000):
+        """Copy element and platform from each Observation onto its OBSERVES relationship.
+
+        Queries filter on these relationship properties, so databases created before they
+        were written must be migrated once. The migration commits every `batch_size`
+        relationships and skips ones that already have the properties, so it can be run
+        while the database is in use and restarted if it is interrupted.
+
+        Args:
+            batch_size (int, optional): Number of relationships to update per transaction. Defaults to 10000.
+        """
+        with self.session() as session:
+            session.run(DROP_LEGACY_INDEX).consume()
+            session.write_transaction(self._init_index)
+            start = time.perf_counter()
+            summary = session.run(
+                MIGRATE_OBSERVES.format(batch_size=int(batch_size))
+            ).consume()
+        n = summary.counters.properties_set // 2
+        elapsed = time.perf_counter() - start
+        logger.info(f"Migrated {n} OBSERVES relationships in {elapsed:.1f} seconds.")
+
+    def migrate_to_compact_ids(self, batch_size: int = 10000) -> int:
+        """Replace the string id of every observation with its compact int64 id.
+
+        Ids are streamed from the database, converted locally with observation_ids, and
+        written back in batches of `batch_size`. Observations that already have a compact
+        id are skipped, so the migration can be restarted if it is interrupted. Connect
+        with compact_ids=True afterwards, and rebuild any IdIndex.
+
+        Args:
+            batch_size (int, optional): Number of ids to update per transaction. Defaults to 10000.
+
+        Returns:
+            int: The number of ids migrated.
+        """
+        n = 0
+        start = time.perf_counter()
+        with self.driver.session(
+            default_access_mode=READ_ACCESS, fetch_size=self.fetch_size
+        ) as read_session, self.driver.session() as write_session:
+            with read_session.begin_transaction() as tx:
+                result = tx.run(LIST_STRING_IDS)
+                while True:
+                    records = [r.data() for r in islice(result, batch_size)]
+                    if not records:
+                        break
+                    dat = pd.DataFrame(records)
+                    rows = [
+                        {"old": old, "new": new}
+                        for old, new in zip(
+                            dat["id"].tolist(),
+                            observation_ids(dat, compact=True).tolist(),
+                        )
+                    ]
+                    write_session.write_transaction(self._update_ids, rows)
+                    n += len(rows)
+                    logger.info(
+                        f"Migrated {n} ids ({n/(time.perf_counter() - start):,.0f} ids/sec)."
+                    )
+        logger.info(f"Migrated {n} ids to compact keys.")
+        return n
+
+    def explain(
+        self, station: str, start_time: int, end_time: int, element: str
+    ) -> List[str]:
+        """Get the operators of the plan Neo4j would use for `query`, without running it.
+
+        Useful to check the relationship indexes are used, e.g. that the result contains
+        'DirectedRelationshipIndexSeekByRange' on 'OBSERVES(element, timestamp)' rather
+        than only 'Expand(All)' over every relationship of a station.
+
+        Args:
+            station (str): The name of the Montana Mesonet station to query.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            element (str): The satellite indicator to gather data for.
+
+        Returns:
+            List[str]: The operator types in the plan, from the root down, each followed by the
+            operator's details (such as the index it reads) when the plan has them.
+        """
+        with self.session() as session:
+            summary = session.run(
+                f"EXPLAIN {QUERY}",
+                station=station,
+                start_time=start_time,
+                end_time=end_time,
+                element=element,
+            ).consume()
+
+        operators = []
+        stack = [summary.plan]
+        while stack:
+            plan = stack.pop()
+            details = plan.get("args", {}).get("Details")
+            operators.append(
+                f"{plan['operatorType']} {details}" if details else plan["operatorType"]
+            )
+            stack.extend(reversed(plan.get("children", [])))
+        return operators
+
+    def iter_query(
+        self,
+        station: str,
+        start_time: int,
+        end_time: int,
+        element: str,
+        chunk_size: int = 100000,
+        fetch_size: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Stream the results of `query` as dataframes of at most `chunk_size` rows.
+
+        Records are pulled off the Bolt cursor `fetch_size` at a time, so the full result
+        is never held in memory at once. The read transaction stays open until the
+        generator is exhausted or closed.
+
+        Args:
+            station (str): The name of the Montana Mesonet station to query.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            element (str): The satellite indicator to gather data for.
+            chunk_size (int, optional): Maximum number of rows per yielded dataframe. Defaults to 100000.
+            fetch_size (Optional[int], optional): Records to pull from the server per batch. Defaults to the
+                value given to the constructor.
+
+        Yields:
+            Iterator[pd.DataFrame]: Dataframes with the same columns as `query`.
+        """
+        yield from self.iter_query_many(
+            [station], [element], start_time, end_time, chunk_size, fetch_size
+        )
+
+    def iter_query_many(
+        self,
+        stations: List[str],
+        elements: List[str],
+        start_time: int,
+        end_time: int,
+        chunk_size: int = 100000,
+        fetch_size: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Stream the results of `query_many` as dataframes of at most `chunk_size` rows.
+
+        Inside a `session` block the held session is reused. If the read fails part way
+        with a transient error, it is run again from where it stopped.
+
+        Args:
+            stations (List[str]): The names of the Montana Mesonet stations to query.
+            elements (List[str]): The satellite indicators to gather data for.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            chunk_size (int, optional): Maximum number of rows per yielded dataframe. Defaults to 100000.
+            fetch_size (Optional[int], optional): Records to pull from the server per batch. Defaults to the
+                value given to the constructor.
+
+        Yields:
+            Iterator[pd.DataFrame]: Long-format dataframes with the same columns as `query`.
+        """
+        stations, elements = list(stations), list(elements)
+        fetch_size = fetch_size or self.fetch_size
+        if self.schema == "chunk":
+            records = self._iter_records(
+                QUERY_CHUNKS,
+                fetch_size,
+                stations=stations,
+                elements=elements,
+                start_year=pd.Timestamp(start_time, unit="s").year,
+                end_year=pd.Timestamp(end_time, unit="s").year,
+            )
+            yield from self._iter_chunks(records, start_time, end_time, chunk_size)
+            return
+
+        if len(stations) == 1 and len(elements) == 1:
+            records = self._iter_records(
+                QUERY,
+                fetch_size,
+                station=stations[0],
+                element=elements[0],
+                start_time=start_time,
+                end_time=end_time,
+            )
+        else:
+            records = self._iter_records(
+                QUERY_MANY,
+                fetch_size,
+                stations=stations,
+                elements=elements,
+                start_time=start_time,
+                end_time=end_time,
+            )
+        while True:
+            batch = list(islice(records, chunk_size))
+            if not batch:
+                break
+            yield pd.DataFrame.from_records(batch, columns=QUERY_COLUMNS)
+
+    def _iter_records(
+        self, statement: str, fetch_size: int, retries: int = 3, **params
+    ) -> Iterator[Any]:
+        """Stream the records of an ordered read query, resuming after a transient error.
+
+        A managed read_transaction can't retry a generator, so on a TransientError the
+        query is run again and the records that were already yielded are skipped. This
+        relies on the statement having an ORDER BY.
+        """
+        done = 0
+        for attempt in range(retries + 1):
+            try:
+                with self._read_session(fetch_size) as session:
+                    with session.begin_transaction() as tx:
+                        for i, record in enumerate(tx.run(statement, **params)):
+                            if i < done:
+                                continue
+                            done += 1
+                            yield record
+                return
+            except TransientError as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"Transient error after {done} records, retrying: {e}")
+
+    @contextmanager
+    def _read_session(self, fetch_size: int):
+        """Reuse the session held by `session` on this thread, or open a read session."""
+        if getattr(self._local, "session", None) is not None:
+            yield self._local.session
+            return
+
+        with self.driver.session(
+            default_access_mode=READ_ACCESS, fetch_size=fetch_size
+        ) as session:
+            yield session
+
+    def _iter_chunks(
+        self, result, start_time: int, end_time: int, chunk_size: int
+    ) -> Iterator[pd.DataFrame]:
+        """Unpack a stream of chunk records into dataframes of at most `chunk_size` rows.
+
+        Records are collected until they hold at least `chunk_size` timestamps and then
+        unpacked together, so each row is only copied a bounded number of times.
+        """
+        buffer = pd.DataFrame(columns=QUERY_COLUMNS)
+        records, pending = [], 0
+        for record in result:
+            records.append(record)
+            pending += len(record[4])
+            if pending < chunk_size:
+                continue
+            buffer = self._unpack_buffer(buffer, records, start_time, end_time)
+            records, pending = [], 0
+            while len(buffer) >= chunk_size:
+                yield buffer.iloc[:chunk_size].reset_index(drop=True)
+                buffer = buffer.iloc[chunk_size:]
+        buffer = self._unpack_buffer(buffer, records, start_time, end_time)
+        if len(buffer):
+            yield buffer.reset_index(drop=True)
+
+    def _unpack_buffer(
+        self, buffer: pd.DataFrame, records: list, start_time: int, end_time: int
+    ) -> pd.DataFrame:
+        """Append the rows of `records` to the rows left over from the last yielded chunk."""
+        if not records:
+            return buffer
+        dat = self._unpack_chunks(records, start_time, end_time)
+        return pd.concat([buffer, dat], ignore_index=True) if len(buffer) else dat
 
     def query(
         self, station: str, start_time: int, end_time: int, element: str
@@ -54,109 +744,587 @@ class MesonetSatelliteDB:
         Returns:
             pd.DataFrame: A dataframe of the data returned from the query.
         """
-        with self.driver.session() as session:
+        if self.cache is not None:
+            return self.cache.get(
+                station,
+                element,
+                start_time,
+                end_time,
+                lambda start, end: self._query(station, start, end, element),
+            )
+        return self._query(station, start_time, end_time, element)
 
-            try:
-                response = session.write_transaction(
-                    self._build_query,
-                    station=station,
-                    start_time=start_time,
-                    end_time=end_time,
-                    element=element,
+    def _query(
+        self, station: str, start_time: int, end_time: int, element: str
+    ) -> pd.DataFrame:
+        dfs = list(self.iter_query(station, start_time, end_time, element))
+        if not dfs:
+            logger.warning("No available data for this query.")
+            return pd.DataFrame()
+        return pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
+
+    def query_many(
+        self,
+        stations: List[str],
+        elements: List[str],
+        start_time: int,
+        end_time: int,
+        wide: bool = False,
+    ) -> pd.DataFrame:
+        """Query the Neo4j database for several stations and elements in a single round trip.
+
+        Args:
+            stations (List[str]): The names of the Montana Mesonet stations to query.
+            elements (List[str]): The satellite indicators to gather data for.
+            start_time (int): The start time to begin the query formatted as seconds since 1970-01-01.
+            end_time (int): The time to end the query formatted as seconds since 1970-01-01.
+            wide (bool, optional): Whether to pivot the result so each element is its own column. Defaults to False.
+
+        Returns:
+            pd.DataFrame: A long-format dataframe with the same columns as `query`, or a wide dataframe
+            indexed by station, date and platform with one column per element if `wide` is True.
+        """
+        dfs = list(self.iter_query_many(stations, elements, start_time, end_time))
+        if dfs:
+            dat = pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
+        else:
+            logger.warning("No available data for this query.")
+            dat = pd.DataFrame(columns=QUERY_COLUMNS)
+
+        if wide:
+            dat = self._pivot_wide(dat)
+
+        return dat
+
+    @staticmethod
+    def _unpack_chunks(response, start_time: int, end_time: int) -> pd.DataFrame:
+        """Expand (station, platform, element, units, timestamps, values) chunk records into rows within a time range."""
+        dfs = []
+        for station, platform, element, units, timestamps, values in response:
+            timestamps = np.asarray(timestamps, dtype="int64")
+            keep = (timestamps >= start_time) & (timestamps <= end_time)
+            dfs.append(
+                pd.DataFrame(
+                    {
+                        "station": station,
+                        "date": timestamps[keep],
+                        "platform": platform,
+                        "element": element,
+                        "value": np.asarray(values, dtype="float64")[keep],
+                        "units": units,
+                    }
                 )
-                dat = pd.DataFrame(response)
-                dat.columns = [
-                    "station",
-                    "date",
-                    "platform",
-                    "element",
-                    "value",
-                    "units",
-                ]
-            except ValueError as e:
-                logger.exception(e)
-                logger.exception("No available data for this query.")
-                dat = pd.DataFrame()
-            return dat
+            )
+        if not dfs:
+            return pd.DataFrame(columns=QUERY_COLUMNS)
+        return pd.concat(dfs, ignore_index=True)
 
-    def post(self, dat: pd.DataFrame):
+    @staticmethod
+    def _to_chunks(dat: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Group to_db_format rows into one time-sorted chunk per station/platform/element/year."""
+        dat = dat.assign(
+            timestamp=dat.timestamp.astype("int64"),
+            year=pd.to_datetime(dat.timestamp, unit="s").dt.year,
+        )
+        dat = dat.sort_values("timestamp")
+        chunks = []
+        keys = ["station", "platform", "element", "year"]
+        groups = dat.groupby(keys, sort=False, observed=True)
+        for (station, platform, element, year), tmp in groups:
+            chunks.append(
+                {
+                    "station": str(station),
+                    "platform": str(platform),
+                    "element": str(element),
+                    "year": int(year),
+                    "units": str(tmp.units.iloc[0]),
+                    "timestamps": tmp.timestamp.tolist(),
+                    "values": tmp.value.astype(float).tolist(),
+                }
+            )
+        return chunks
+
+    def _post_chunked(self, dat: pd.DataFrame, batch_size: int):
+        """Merge rows into their Chunk nodes, writing roughly `batch_size` rows per transaction."""
+        chunks = self._to_chunks(dat)
+        n = len(dat)
+        start = time.perf_counter()
+        written = 0
+        batch = []
+        with self.session() as session:
+            for idx, chunk in enumerate(chunks):
+                batch.append(chunk)
+                rows = sum(len(c["timestamps"]) for c in batch)
+                if rows < batch_size and idx < len(chunks) - 1:
+                    continue
+                session.write_transaction(self._post_chunks, batch)
+                written += rows
+                batch = []
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    f"{(written/n)*100:2.3f}% of New Observations Uploaded ({written/elapsed:,.0f} rows/sec)"
+                )
+
+    def migrate_to_chunks(self, drop_observations: bool = False):
+        """Copy every Observation in the database into the chunk schema, one station at a time.
+
+        Once complete, connect with schema="chunk" to read and write the chunks.
+
+        Args:
+            drop_observations (bool, optional): Delete each station's Observation nodes once its chunks
+                are written. Defaults to False.
+        """
+        with self.session() as session:
+            session.write_transaction(self._init_chunk_index)
+            stations = [x[0] for x in session.read_transaction(self._list_stations)]
+            for station in stations:
+                response = session.read_transaction(
+                    self._build_station_query, station=station
+                )
+                dat = pd.DataFrame(response, columns=QUERY_COLUMNS)
+                dat = dat.rename(columns={"date": "timestamp"})
+                for chunk in np.array_split(
+                    np.arange(len(dat)), max(1, len(dat) // 50000)
+                ):
+                    session.write_transaction(
+                        self._post_chunks, self._to_chunks(dat.iloc[chunk])
+                    )
+                if drop_observations:
+                    session.write_transaction(self._drop_observations, station)
+                logger.info(f"Migrated {len(dat)} observations at {station} to chunks.")
+
+    def post(self, dat: pd.DataFrame, batch_size: int = 5000):
         """Write data to the Neo4j database.
 
+        Rows are sent in batches as a parameter list to a single UNWIND/MERGE statement,
+        with one transaction per batch over a single session. If a batch fails on a
+        constraint conflict, that batch alone is retried row by row so the rest of the
+        rows still get written.
+
+        If the connection has an `id_index`, rows already in the index are dropped before
+        anything is sent, and the ids of each committed batch are added to it.
+
         Args:
             dat (pd.DataFrame): Satellite data reformatted using the to_db_format function.
+            batch_size (int, optional): Number of rows to send per transaction. Defaults to 5000.
         """
-        gen = dat.iterrows()
-        for idx, row in gen:
-            if idx % 1000 == 0:
-                status = f"{(idx/len(dat))*100:2.3f}% of New Observations Uploaded"
-                logger.info(status)
+        if self.compact_ids and not pd.api.types.is_integer_dtype(dat["id"]):
+            dat = dat.assign(id=observation_ids(dat, compact=True))
+
+        if self.id_index is not None and len(dat):
+            existing = self.id_index.contains(dat["id"].to_numpy())
+            if existing.any():
+                logger.info(
+                    f"Skipping {existing.sum()} observations already in the database."
+                )
+                dat = dat[~existing]
+
+        n = len(dat)
+        if n == 0:
+            logger.info("No new observations to upload.")
+            return
+
+        try:
+            self._post(dat, batch_size)
+        finally:
+            if self.id_index is not None:
+                self.id_index.save()
+            if self.cache is not None:
+                pairs = dat[["station", "element"]].drop_duplicates()
+                for station, element in pairs.itertuples(index=False):
+                    self.cache.invalidate(station, element)
+
+    def _post(self, dat: pd.DataFrame, batch_size: int):
+        n = len(dat)
+        if self.schema == "chunk":
+            self._post_chunked(dat, batch_size)
+            self._index_written(dat["id"].to_numpy())
+            return
+
+        start = time.perf_counter()
+        written = 0
+        with self.session() as session:
+            for idx in range(0, n, batch_size):
+                rows = self._to_records(dat.iloc[idx : idx + batch_size])
+                try:
+                    session.write_transaction(self._post_batch, rows)
+                except ConstraintError as e:
+                    logger.warning(
+                        f"Constraint conflict in rows {idx}-{idx + len(rows)}, retrying batch row by row: {e}"
+                    )
+                    self._post_rows(session, rows)
+                # Rows rejected by the constraint are already stored, so every id in the
+                # batch is now in the database.
+                self._index_written([row["id"] for row in rows])
+                written += len(rows)
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    f"{(written/n)*100:2.3f}% of New Observations Uploaded ({written/elapsed:,.0f} rows/sec)"
+                )
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Uploaded {n} observations in {elapsed:.1f} seconds ({n/elapsed:,.0f} rows/sec)."
+        )
+
+    def _index_written(self, ids):
+        """Add ids that were just written to the id index."""
+        if self.id_index is not None:
+            self.id_index.add(ids)
+
+    def count_ids(self) -> int:
+        """Count the observations stored in the database.
+
+        The Observation count comes from Neo4j's count store, so it doesn't scan the graph.
+
+        Returns:
+            int: Number of observations, or of chunk timestamps with schema="chunk".
+        """
+        statement = COUNT_CHUNK_IDS if self.schema == "chunk" else COUNT_IDS
+        with self.driver.session(default_access_mode=READ_ACCESS) as session:
+            return session.read_transaction(self._values, statement)[0][0]
+
+    def iter_ids(self, chunk_size: int = 1000000) -> Iterator[np.ndarray]:
+        """Stream every observation id in the database.
+
+        With schema="chunk", ids are rebuilt from the chunk arrays in the same format
+        to_db_format creates them.
+
+        Args:
+            chunk_size (int, optional): Maximum number of ids per yielded array. Defaults to 1000000.
+
+        Yields:
+            Iterator[np.ndarray]: Arrays of observation ids.
+        """
+        with self.driver.session(
+            default_access_mode=READ_ACCESS, fetch_size=self.fetch_size
+        ) as session:
+            with session.begin_transaction() as tx:
+                if self.schema == "chunk":
+                    result = tx.run(
+                        "MATCH (c:Chunk) RETURN c.station, c.platform, c.element, c.units, c.timestamps, c.values"
+                    )
+                    for dat in self._iter_chunks(
+                        result, -(2**63), 2**63 - 1, chunk_size
+                    ):
+                        dat = dat.rename(columns={"date": "timestamp"})
+                        yield observation_ids(dat, compact=self.compact_ids)
+                    return
+
+                result = tx.run("MATCH (obs:Observation) RETURN obs.id")
+                while True:
+                    ids = [r[0] for r in islice(result, chunk_size)]
+                    if not ids:
+                        break
+                    yield np.asarray(ids, dtype="int64" if self.compact_ids else object)
+
+    def _post_rows(self, session, rows: List[Dict[str, Any]]):
+        """Write rows one transaction at a time, logging the ones that violate a constraint."""
+        for row in rows:
             try:
-                with self.driver.session() as session:
-                    session.write_transaction(self._post_data, **row.to_dict())
+                session.write_transaction(self._post_data, **row)
             except ConstraintError as e:
                 logger.exception(e)
 
-    def get_latest(self):
-        with self.driver.session() as session:
-            response = session.write_transaction(self._get_latest)
-            dat = pd.DataFrame(response)
+    @staticmethod
+    def _to_records(dat: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Convert a dataframe to a list of dicts of native Python types the driver can send."""
+        cols = ["station", "id", "platform", "element", "value", "units", "timestamp"]
+        return dat[cols].astype(object).to_dict("records")
 
-        dat.columns = ["date", "platform", "element"]
-        dat = dat.assign(date=pd.to_datetime(dat.date, unit="s"))
+    def export(
+        self,
+        path: Union[str, Path],
+        stations: Optional[List[str]] = None,
+        elements: Optional[List[str]] = None,
+        since: Optional[int] = None,
+        chunk_size: int = 500000,
+    ) -> int:
+        """Export observations to a Parquet dataset partitioned by station and element.
+
+        Results are streamed from the database in chunks of `chunk_size` rows and appended
+        to path/station=.../element=.../ as typed columns (int64 timestamp, float32 value,
+        categorical platform and units). The latest timestamp exported for each series is
+        recorded in path/_export_watermarks.json, and when `since` isn't given only
+        observations newer than that, plus any new series, are exported. Older observations
+        backfilled into a series that was already exported need a full export (since=0).
+        Rows already on disk at or after the time a series is exported from are removed
+        first, so overlapping exports replace them instead of duplicating them.
+
+        Args:
+            path (Union[str, Path]): Directory of the Parquet dataset. Created if it doesn't exist.
+            stations (Optional[List[str]], optional): Stations to export. Defaults to all stations.
+            elements (Optional[List[str]], optional): Elements to export. Defaults to all elements.
+            since (Optional[int], optional): Export every observation at or after this time, formatted as
+                seconds since 1970-01-01, instead of resuming from the export watermarks. Defaults to None.
+            chunk_size (int, optional): Number of rows to read and write at a time. Defaults to 500000.
+
+        Returns:
+            int: The number of observations exported.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        watermark_f = path / "_export_watermarks.json"
+        exported = json.loads(watermark_f.read_text()) if watermark_f.exists() else {}
 
+        with self.session() as session:
+            if self._watermarks_complete(session):
+                series = session.read_transaction(self._list_series)
+            else:
+                series = session.read_transaction(
+                    self._values, WATERMARK_SCANS[self.schema]["series"]
+                )
+
+        # Group series by the time their export starts from, so each group is one query.
+        groups = {}
+        for station, element, latest in series:
+            if stations is not None and station not in stations:
+                continue
+            if elements is not None and element not in elements:
+                continue
+            prev = exported.get(f"{station}/{element}")
+            if since is not None:
+                start_time = since
+            elif prev is None:
+                start_time = 0
+            elif prev < latest:
+                start_time = prev + 1
+            else:
+                continue
+            groups.setdefault(start_time, []).append((station, element))
+
+        # Watermarks are moved back before rows are removed, so an interrupted export
+        # never has a watermark past the rows that are on disk.
+        for start_time, pairs in groups.items():
+            for station, element in pairs:
+                key = f"{station}/{element}"
+                if start_time <= 0:
+                    exported.pop(key, None)
+                elif key in exported:
+                    exported[key] = min(exported[key], start_time - 1)
+        watermark_f.write_text(json.dumps(exported, indent=2, sort_keys=True))
+        for start_time, pairs in groups.items():
+            for station, element in pairs:
+                self._trim_partition(path, station, element, start_time)
+
+        n = 0
+        start = time.perf_counter()
+        for start_time, pairs in groups.items():
+            keep = pd.MultiIndex.from_tuples(pairs)
+            for dat in self.iter_query_many(
+                sorted({x[0] for x in pairs}),
+                sorted({x[1] for x in pairs}),
+                start_time,
+                MAX_TIMESTAMP,
+                chunk_size=chunk_size,
+            ):
+                dat = dat[
+                    pd.MultiIndex.from_frame(dat[["station", "element"]]).isin(keep)
+                ]
+                if len(dat) == 0:
+                    continue
+                dat = dat.rename(columns={"date": "timestamp"}).astype(
+                    {
+                        "timestamp": "int64",
+                        "value": "float32",
+                        "platform": "category",
+                        "units": "category",
+                    }
+                )
+                dat.to_parquet(path, partition_cols=["station", "element"], index=False)
+                for (station, element), latest in (
+                    dat.groupby(["station", "element"])["timestamp"].max().items()
+                ):
+                    key = f"{station}/{element}"
+                    exported[key] = max(int(latest), exported.get(key, int(latest)))
+                # Saved after every chunk so an interrupted export resumes where it stopped.
+                watermark_f.write_text(json.dumps(exported, indent=2, sort_keys=True))
+                n += len(dat)
+                logger.info(
+                    f"Exported {n} observations ({n/(time.perf_counter() - start):,.0f} rows/sec)."
+                )
+
+        logger.info(f"Exported {n} observations to {path}.")
+        return n
+
+    @staticmethod
+    def _trim_partition(path: Path, station: str, element: str, start_time: int):
+        """Remove a series' exported rows at or after `start_time` so they can be exported again."""
+        partition = path / f"station={station}" / f"element={element}"
+        if not partition.exists():
+            return
+        if start_time <= 0:
+            shutil.rmtree(partition)
+            return
+        if (
+            pd.read_parquet(partition, columns=["timestamp"])["timestamp"].max()
+            < start_time
+        ):
+            return
+        dat = pd.read_parquet(partition)
+        dat = dat[dat["timestamp"] < start_time]
+        shutil.rmtree(partition)
+        if len(dat):
+            partition.mkdir(parents=True)
+            dat.to_parquet(partition / "part-0.parquet", index=False)
+
+    def get_latest(self) -> pd.DataFrame:
+        """Get the most recent timestamp of each platform and element across all stations.
+
+        Returns:
+            pd.DataFrame: A dataframe with 'date', 'platform' and 'element' columns.
+        """
+        with self.session() as session:
+            if self._watermarks_complete(session):
+                response = session.read_transaction(self._get_latest)
+            else:
+                response = session.read_transaction(
+                    self._values, WATERMARK_SCANS[self.schema]["latest"]
+                )
+
+        return self._format_watermarks(response)
+
+    def get_earliest(self) -> pd.DataFrame:
+        """Get the oldest timestamp of each platform and element across all stations.
+
+        Returns:
+            pd.DataFrame: A dataframe with 'date', 'platform' and 'element' columns.
+        """
+        with self.session() as session:
+            if self._watermarks_complete(session):
+                response = session.read_transaction(self._get_earliest)
+            else:
+                response = session.read_transaction(
+                    self._values, WATERMARK_SCANS[self.schema]["earliest"]
+                )
+
+        return self._format_watermarks(response)
+
+    def _watermarks_complete(self, session) -> bool:
+        """Check whether the Watermark nodes cover every series in the database."""
+        if not self._has_watermarks:
+            self._has_watermarks = session.read_transaction(
+                self._values, HAS_WATERMARKS
+            )[0][0]
+            if not self._has_watermarks:
+                logger.warning(
+                    "Watermarks haven't been built for this database, falling back to a full scan. "
+                    "Run rebuild_watermarks to build them."
+                )
+        return self._has_watermarks
+
+    @staticmethod
+    def _format_watermarks(response) -> pd.DataFrame:
+        dat = pd.DataFrame(response, columns=["date", "platform", "element"])
+        dat = dat.assign(date=pd.to_datetime(dat.date, unit="s"))
         return dat
 
     @staticmethod
     def _get_latest(tx):
-        result = tx.run(
-            """
-            MATCH (s:Station)-[o:OBSERVES]->(obs:Observation)\n
-            RETURN MAX(o.timestamp) as time, obs.platform as platform, obs.element as element\n
-            ORDER BY time
-            """
-        )
+        result = tx.run(GET_LATEST)
+        return result.values()
 
+    @staticmethod
+    def _get_earliest(tx):
+        result = tx.run(GET_EARLIEST)
         return result.values()
 
+    @staticmethod
+    def _values(tx, statement):
+        return tx.run(statement).values()
+
+    @staticmethod
+    def _run(tx, statement):
+        tx.run(statement)
+
+    @staticmethod
+    def _rebuild_watermarks(tx):
+        for statement in REBUILD_WATERMARKS:
+            tx.run(statement)
+
+    @staticmethod
+    def _rebuild_chunk_watermarks(tx):
+        for statement in REBUILD_CHUNK_WATERMARKS:
+            tx.run(statement)
+
     @staticmethod
     def _post_data(tx, **kwargs):
-        tx.run(
-            "MERGE (s:Station {name: $station}) "
-            "MERGE (o:Observation {id: $id, platform: $platform, element: $element, value: $value, units: $units}) "
-            "MERGE (s)-[:OBSERVES{timestamp: toInteger($timestamp)}]->(o);",
-            **kwargs,
-        )
+        tx.run(POST_DATA, **kwargs)
+        tx.run(UPDATE_WATERMARKS, rows=[kwargs])
+
+    @staticmethod
+    def _post_batch(tx, rows):
+        tx.run(POST_BATCH, rows=rows)
+        tx.run(UPDATE_WATERMARKS, rows=rows)
+
+    @staticmethod
+    def _update_ids(tx, rows):
+        tx.run(UPDATE_IDS, rows=rows)
+
+    @staticmethod
+    def _init_index(tx):
+        for statement in INIT_INDEX:
+            tx.run(statement)
+
+    @staticmethod
+    def _init_chunk_index(tx):
+        for statement in INIT_CHUNK_INDEX:
+            tx.run(statement)
+
+    @staticmethod
+    def _list_series(tx):
+        return tx.run(LIST_SERIES).values()
+
+    @staticmethod
+    def _list_stations(tx):
+        return tx.run(LIST_STATIONS).values()
 
     @staticmethod
-    def _build_query(tx, **kwargs):
+    def _build_station_query(tx, station):
         result = tx.run(
-            "MATCH p = (obs:Observation)<-[o:OBSERVES]-(s:Station) "
-            "WHERE o.timestamp >= $start_time and o.timestamp <= $end_time and s.name = $station and obs.element = $element "
+            "MATCH (obs:Observation)<-[o:OBSERVES]-(s:Station {name: $station}) "
             "RETURN s.name, o.timestamp, obs.platform,  obs.element, obs.value, obs.units",
-            **kwargs,
+            station=station,
         )
         return result.values()
 
     @staticmethod
-    def _init_index(tx):
-        tx.run("CREATE INDEX timestampIndex FOR (o:OBSERVES) on (o.timestamp); ")
-        tx.run(
-            "CREATE CONSTRAINT obsIdConstraint "
-            "FOR (obs:Observation) "
-            "REQUIRE obs.id IS UNIQUE; "
-        )
+    def _drop_observations(tx, station):
         tx.run(
-            "CREATE CONSTRAINT stationConstraint "
-            "FOR (s:Station) "
-            "REQUIRE s.name IS UNIQUE; "
+            "MATCH (s:Station {name: $station})-[:OBSERVES]->(obs:Observation) "
+            "DETACH DELETE obs",
+            station=station,
         )
 
     @staticmethod
-    def _init_db(tx, f_path):
-        tx.run(
-            "LOAD CSV WITH HEADERS FROM $f_path AS line "
-            "MERGE (station:Station {name: line.station}) "
-            "CREATE (obs:Observation {id: line.id, platform: line.platform, element: line.element, value: toFloat(line.value), units: toString(line.units)}) "
-            "CREATE (station)-[:OBSERVES {timestamp: toInteger(line.timestamp)}]->(obs) ",
-            f_path=f_path,
-        )
+    def _post_chunks(tx, chunks):
+        """Merge new chunk arrays into any existing chunks. Existing values win on duplicate timestamps."""
+        keys = [
+            {k: c[k] for k in ["station", "platform", "element", "year"]}
+            for c in chunks
+        ]
+        existing = {
+            tuple(r[:4]): (r[4], r[5]) for r in tx.run(GET_CHUNKS, keys=keys).values()
+        }
+        bounds = []
+        for c in chunks:
+            key = (c["station"], c["platform"], c["element"], c["year"])
+            if key in existing:
+                timestamps, values = existing[key]
+                merged = pd.Series(
+                    values + c["values"], index=timestamps + c["timestamps"]
+                )
+                merged = merged[~merged.index.duplicated(keep="first")].sort_index()
+                c["timestamps"] = merged.index.tolist()
+                c["values"] = merged.tolist()
+            for timestamp in [c["timestamps"][0], c["timestamps"][-1]]:
+                bounds.append(
+                    {
+                        "station": c["station"],
+                        "platform": c["platform"],
+                        "element": c["element"],
+                        "timestamp": timestamp,
+                    }
+                )
+        tx.run(POST_CHUNKS, chunks=chunks)
+        tx.run(UPDATE_WATERMARKS, rows=bounds)
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field, fields
-from typing import Dict, List, Optional
+import json
+import os
+import time
+from dataclasses import InitVar, dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
 
 import requests
+from loguru import logger
+
+PRODUCT_URL = "https://appeears.earthdatacloud.nasa.gov/api/product/{0}"
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "mt_mesonet_satellite" / "products.json"
 
 
 @dataclass
@@ -37,28 +45,126 @@ class Layer:
         return Layer(**{k: v for k, v in d.items() if k in cls_fields})
 
 
+@dataclass
+class ProductCache:
+    """Cache of the layer metadata AppEEARS returns for each product.
+
+    Metadata is memoised in memory and persisted to a JSON file, so repeated lookups in a
+    run don't go to AppEEARS and later runs can clean files offline. An entry older than
+    `ttl` is fetched again, but is still used if AppEEARS can't be reached.
+
+    Attributes:
+        path (Optional[Union[str, Path]]): JSON file the cache is loaded from and saved to. If None, the cache is only kept in memory.
+        ttl (float): Seconds a product's metadata stays valid after it is fetched. Defaults to a week.
+    """
+
+    path: Optional[Union[str, Path]] = DEFAULT_CACHE_PATH
+    ttl: float = 7 * 24 * 3600.0
+    _entries: Dict[str, Dict[str, Any]] = field(
+        default_factory=dict, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.path = Path(self.path) if self.path is not None else None
+        if self.path is not None and self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable product cache {self.path}: {e}")
+
+    @classmethod
+    def default(cls) -> ProductCache:
+        """Get the cache shared by every Product, stored at the 'ProductCachePath' environment variable if it is set."""
+        global _default_cache
+        if _default_cache is None:
+            _default_cache = cls(os.getenv("ProductCachePath", DEFAULT_CACHE_PATH))
+        return _default_cache
+
+    def get(self, product: str, refresh: bool = False) -> Optional[Dict[str, Dict]]:
+        """Get the raw layer metadata of a product, fetching it from AppEEARS if it isn't cached or has expired.
+
+        Args:
+            product (str): The product name, formatted as NAMEOFPRODUCT.XXX.
+            refresh (bool, optional): Whether to fetch the metadata even if a valid entry is cached. Defaults to False.
+
+        Returns:
+            Optional[Dict[str, Dict]]: The metadata of each layer, keyed by layer name, or None if the product doesn't exist.
+        """
+        entry = self._entries.get(product)
+        if (
+            entry is not None
+            and not refresh
+            and time.time() - entry["fetched"] < self.ttl
+        ):
+            return entry["layers"]
+
+        try:
+            response = requests.get(PRODUCT_URL.format(product))
+        except requests.RequestException as e:
+            if entry is None:
+                raise
+            logger.warning(
+                f"Using cached metadata for {product}, AppEEARS couldn't be reached: {e}"
+            )
+            return entry["layers"]
+
+        if response.status_code != 200:
+            return None
+        self._entries[product] = {"fetched": time.time(), "layers": response.json()}
+        self.save()
+        return self._entries[product]["layers"]
+
+    def refresh(self, products: Optional[List[str]] = None):
+        """Fetch the metadata of products again, regardless of their age.
+
+        Args:
+            products (Optional[List[str]], optional): Products to refresh. Defaults to None, which refreshes every cached product.
+        """
+        for product in products if products is not None else list(self._entries):
+            self.get(product, refresh=True)
+
+    def save(self):
+        """Write the cache to `path`, replacing the previous file in a single step."""
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+
+_default_cache: Optional[ProductCache] = None
+
+
 @dataclass
 class Product:
     """Class to represent a satellite data product
 
+    Layer metadata is read through a ProductCache, so it is only fetched from AppEEARS when
+    it isn't cached or has expired.
+
     Attributes:
         product (str): The name of the product to get data for. Formatted as NAMEOFPRODUCT.XXX, where XXX is the product version number.
         layers (Dict[str, Layer]): List of layers associated with a product.
+        cache (Optional[ProductCache]): Cache to read the metadata from. Defaults to ProductCache.default().
+        refresh (bool): Whether to fetch the metadata from AppEEARS even if it is cached.
     """
 
     product: str
     layers: Dict[str, Layer] = field(init=False)
+    cache: InitVar[Optional[ProductCache]] = None
+    refresh: InitVar[bool] = False
 
-    def __post_init__(self):
-        self.layers = self.get_layers()
+    def __post_init__(self, cache: Optional[ProductCache], refresh: bool):
+        self.layers = self.get_layers(cache, refresh)
 
-    def get_layers(self):
-        response = requests.get(
-            "https://appeears.earthdatacloud.nasa.gov/api/product/{0}".format(
-                self.product
-            )
-        )
-        layer_response = response.json()
-        if response.status_code != 200:
+    def get_layers(
+        self, cache: Optional[ProductCache] = None, refresh: bool = False
+    ) -> Optional[Dict[str, Layer]]:
+        cache = cache if cache is not None else ProductCache.default()
+        layer_response = cache.get(self.product, refresh=refresh)
+        if layer_response is None:
             return None
         return {k: Layer.from_dict(v) for k, v in layer_response.items()}
@@ -0,0 +1,96 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .Product import Layer
+
+
+@dataclass(frozen=True)
+class QualityRule:
+    """A bit field of a QA layer and the values of it that are accepted.
+
+    Attributes:
+        start_bit (int): Position of the field's lowest bit, counting from 0.
+        length (int): Number of bits in the field.
+        accepted (Tuple[int, ...]): Values of the field that mark an observation as usable.
+    """
+
+    start_bit: int
+    length: int
+    accepted: Tuple[int, ...]
+
+    def passes(self, qa: np.ndarray) -> np.ndarray:
+        """Decode the field from integer QA values and check it against the accepted values.
+
+        Args:
+            qa (np.ndarray): Integer QA values.
+
+        Returns:
+            np.ndarray: Boolean array that is True where the field has an accepted value.
+        """
+        bits = (qa >> self.start_bit) & ((1 << self.length) - 1)
+        return np.isin(bits, self.accepted)
+
+
+@dataclass
+class QualityPolicy:
+    """Rules that observations must pass for each QA layer of a product.
+
+    Attributes:
+        rules (Dict[str, List[QualityRule]]): Rules keyed by QA layer name. An observation is kept only
+            if every rule of every QA layer its science layer refers to passes.
+    """
+
+    rules: Dict[str, List[QualityRule]] = field(default_factory=dict)
+
+    def passes(self, qa_layer: str, qa: np.ndarray) -> np.ndarray:
+        """Check QA values against every rule of a QA layer.
+
+        Missing QA values (NaN) pass, since there is nothing to decode.
+
+        Args:
+            qa_layer (str): Name of the QA layer.
+            qa (np.ndarray): The QA layer's values, as read from the .csv.
+
+        Returns:
+            np.ndarray: Boolean array that is True where the observation is usable.
+        """
+        missing = np.isnan(qa)
+        ints = np.where(missing, 0, qa).astype("int64")
+        ok = np.ones(len(qa), dtype=bool)
+        for rule in self.rules.get(qa_layer, []):
+            ok &= rule.passes(ints)
+        return ok | missing
+
+
+def quality_layer_names(layer: Layer) -> List[str]:
+    """Get the names of the QA layers a science layer refers to.
+
+    AppEEARS formats Layer.QualityLayers as a string of a list, e.g. "['_500m_16_days_VI_Quality']".
+
+    Args:
+        layer (Layer): The science layer.
+
+    Returns:
+        List[str]: Names of its QA layers.
+    """
+    names = (layer.QualityLayers or "").strip("[]").split(",")
+    return [x.strip().strip("'\"") for x in names if x.strip().strip("'\"")]
+
+
+# MODLAND QA (bits 0-1) of 0 is good quality, 1 is produced but worth checking other QA.
+_VI_QUALITY = [QualityRule(0, 2, (0, 1))]
+# MODLAND_QC (bit 0) of 0 is good quality and SCF_QC (bits 5-7) of 0 or 1 is the main
+# algorithm, with or without saturation.
+_MOD15_MOD16_QC = [QualityRule(0, 1, (0,)), QualityRule(5, 3, (0, 1))]
+
+DEFAULT_POLICIES: Dict[str, QualityPolicy] = {
+    "MOD13A1.061": QualityPolicy({"_500m_16_days_VI_Quality": _VI_QUALITY}),
+    "MYD13A1.061": QualityPolicy({"_500m_16_days_VI_Quality": _VI_QUALITY}),
+    "VNP13A1.001": QualityPolicy({"_500_m_16_days_VI_Quality": _VI_QUALITY}),
+    "MOD15A2H.061": QualityPolicy({"FparLai_QC": _MOD15_MOD16_QC}),
+    "MYD15A2H.061": QualityPolicy({"FparLai_QC": _MOD15_MOD16_QC}),
+    "MOD16A2.061": QualityPolicy({"ET_QC_500m": _MOD15_MOD16_QC}),
+    "MYD16A2.061": QualityPolicy({"ET_QC_500m": _MOD15_MOD16_QC}),
+}
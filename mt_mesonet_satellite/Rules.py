@@ -0,0 +1,146 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class ScaleRule:
+    """Scale factor and unit override for an element, optionally limited to some platforms.
+
+    Attributes:
+        element (str): The element the rule applies to, after renaming.
+        scale (float): Factor values are multiplied by. Defaults to 1.
+        units (Optional[str]): Units to set, or None to keep the cleaned units. Defaults to None.
+        platforms (Optional[Tuple[str, ...]]): Platforms the rule applies to. Defaults to None, which is every platform.
+        exclude_platforms (Tuple[str, ...]): Platforms the rule doesn't apply to. Defaults to none.
+    """
+
+    element: str
+    scale: float = 1.0
+    units: Optional[str] = None
+    platforms: Optional[Tuple[str, ...]] = None
+    exclude_platforms: Tuple[str, ...] = ()
+
+    def applies(self, platform: str, element: str) -> bool:
+        if element != self.element or platform in self.exclude_platforms:
+            return False
+        return self.platforms is None or platform in self.platforms
+
+
+@dataclass
+class CompiledRules:
+    """FormatRules resolved for a set of platform and element categories.
+
+    Tables are indexed by (platform code + 1) * (number of elements + 1) + (element code + 1),
+    so missing (-1) codes land on a row and column that the rules don't touch.
+
+    Attributes:
+        scale (np.ndarray): Factor to multiply values by.
+        units (np.ndarray): Code into `unit_categories` to set, or -1 to keep the cleaned units.
+        drop (np.ndarray): Whether rows are dropped.
+        unit_categories (pd.Index): Unit categories, including any the rules add.
+        n_elements (int): Number of element categories the tables were compiled for.
+    """
+
+    scale: np.ndarray
+    units: np.ndarray
+    drop: np.ndarray
+    unit_categories: pd.Index
+    n_elements: int
+
+    def lookup(
+        self, platform_codes: np.ndarray, element_codes: np.ndarray
+    ) -> np.ndarray:
+        """Get the table index of each row from its platform and element codes."""
+        platform_codes = platform_codes.astype("int64") + 1
+        return platform_codes * (self.n_elements + 1) + (element_codes + 1)
+
+
+@dataclass
+class FormatRules:
+    """Declarative table of the element renames, unit renames, scale factors and dropped elements to_db_format applies.
+
+    Attributes:
+        element_names (Dict[str, str]): New names of AppEEARS layers.
+        unit_names (Dict[str, str]): New names of units.
+        drop_elements (List[str]): Elements, after renaming, that aren't loaded into the database.
+        scales (List[ScaleRule]): Scale factors and unit overrides. When several match, the first one wins.
+    """
+
+    element_names: Dict[str, str] = field(default_factory=dict)
+    unit_names: Dict[str, str] = field(default_factory=dict)
+    drop_elements: List[str] = field(default_factory=list)
+    scales: List[ScaleRule] = field(default_factory=list)
+
+    def compile(
+        self, platforms: pd.Index, elements: pd.Index, unit_categories: pd.Index
+    ) -> CompiledRules:
+        """Resolve the rules into lookup tables over every platform and element pair.
+
+        Args:
+            platforms (pd.Index): Platform categories.
+            elements (pd.Index): Element categories, after renaming.
+            unit_categories (pd.Index): Unit categories, after renaming.
+
+        Returns:
+            CompiledRules: The lookup tables.
+        """
+        shape = (len(platforms) + 1, len(elements) + 1)
+        scale = np.ones(shape, dtype="float64")
+        units = np.full(shape, -1, dtype="int64")
+        drop = np.zeros(shape, dtype=bool)
+
+        for j, element in enumerate(elements, start=1):
+            drop[:, j] = element in self.drop_elements
+            for i, platform in enumerate(platforms, start=1):
+                matches = (x for x in self.scales if x.applies(platform, element))
+                rule = next(matches, None)
+                if rule is None:
+                    continue
+                scale[i, j] = rule.scale
+                if rule.units is not None:
+                    if rule.units not in unit_categories:
+                        unit_categories = unit_categories.append(pd.Index([rule.units]))
+                    units[i, j] = unit_categories.get_loc(rule.units)
+
+        return CompiledRules(
+            scale.ravel(), units.ravel(), drop.ravel(), unit_categories, len(elements)
+        )
+
+
+DEFAULT_RULES = FormatRules(
+    element_names={
+        "ET_500m": "ET",
+        "Fpar_500m": "Fpar",
+        "GPP_gpp_mean": "GPP",
+        "Geophysical_Data_sm_rootzone": "sm_rootzone",
+        "Geophysical_Data_sm_rootzone_wetness": "sm_rootzone_wetness",
+        "Geophysical_Data_sm_surface": "sm_surface",
+        "Geophysical_Data_sm_surface_wetness": "sm_surface_wetness",
+        "Gpp_500m": "GPP",
+        "Lai_500m": "LAI",
+        "PET_500m": "PET",
+        "_500m_16_days_EVI": "EVI",
+        "_500m_16_days_NDVI": "NDVI",
+        "_500_m_16_days_EVI": "EVI",
+        "_500_m_16_days_NDVI": "NDVI",
+        "EVAPOTRANSPIRATION_ALEXI_ETdaily": "ET",
+        "EVAPOTRANSPIRATION_PT_JPL_ETdaily": "ET",
+    },
+    unit_names={"EVI": "unitless", "NDVI": "unitless"},
+    drop_elements=["Geophysical_Data_sm_rootzone_pctl", "_500_m_16_days_EVI2"],
+    scales=[
+        # MODIS GPP is kgC/m^2 per 8 days.
+        ScaleRule(
+            "GPP",
+            scale=1000 / 8,
+            units="gCm^-2day^-1",
+            exclude_platforms=("SPL4CMDL.006",),
+        ),
+        # MODIS ET and PET are totals over 8 days.
+        ScaleRule("ET", scale=1 / 8, exclude_platforms=("ECO3ETALEXI.001",)),
+        ScaleRule("PET", scale=1 / 8),
+    ],
+)
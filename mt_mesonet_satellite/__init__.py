@@ -1,8 +1,23 @@
-from .Clean import Cleaner, clean_all
+from .AsyncNeo4jConn import AsyncMesonetSatelliteDB
+from .Backend import StorageBackend
+from .Cache import QueryCache
+from .Clean import Cleaner, clean_all, iter_clean_all
 from .Geom import Point
+from .IdIndex import IdIndex
+from .LocalStore import LocalSatelliteDB
 from .Neo4jConn import MesonetSatelliteDB
-from .Product import Product
+from .Product import Product, ProductCache
+from .Quality import DEFAULT_POLICIES, QualityPolicy, QualityRule
+from .Rules import DEFAULT_RULES, FormatRules, ScaleRule
 from .Session import Session
 from .Task import InvalidRequestError, PendingTaskError, Submit, Task, list_task
-from .to_db_format import to_db_format
+from .to_db_format import (
+    find_init_files,
+    iter_to_db_format,
+    observation_ids,
+    read_manifest,
+    stream_to_db_format,
+    to_db_format,
+    write_shards,
+)
 from .update import operational_update, start_missing_tasks, wait_on_tasks
@@ -1,11 +1,32 @@
 import argparse
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
 
 import numpy as np
 import pandas as pd
 from loguru import logger
 
+from .IdIndex import IdIndex
+from .Rules import DEFAULT_RULES, FormatRules
+
+# Rows of a master_db.csv read at a time by stream_to_db_format.
+DEFAULT_CHUNKSIZE = 1000000
+
+# dtypes of a master_db.csv written by clean_all.
+CSV_DTYPES = {
+    "ID": "category",
+    "Date": "category",
+    "element": "category",
+    "value": "float64",
+    "units": "category",
+    "product": "category",
+}
+
 
 def to_db_format(
     f: Union[str, Path, pd.DataFrame],
@@ -13,6 +34,12 @@ def to_db_format(
     out_name: Optional[str] = None,
     write=False,
     split=False,
+    admin_import=False,
+    rules: FormatRules = DEFAULT_RULES,
+    compact_ids: bool = False,
+    shard_size: int = 100000,
+    compress: bool = False,
+    workers: int = 4,
 ) -> pd.DataFrame:
     """Convert dates to unix timestamps, clean element names, and save data to neo4j import directory.
        for Ubuntu machines, the defaults is /var/lib/neo4j/import/
@@ -20,97 +47,425 @@ def to_db_format(
     Args:
         f (Union[str, Path]): Path to raw master_db.csv file.
         neo4j_pth (Union[str, Path], optional): Neo4j import directory location. Defaults to "/var/lib/neo4j/import/".
+        admin_import (bool, optional): When writing, save node and relationship files for neo4j-admin import
+            instead of a file for LOAD CSV. Defaults to False.
+        rules (FormatRules, optional): Element and unit renames, scale factors and dropped elements to apply.
+            Defaults to DEFAULT_RULES.
+        compact_ids (bool, optional): Whether to build compact int64 ids instead of strings. See observation_ids.
+            Defaults to False.
+        shard_size (int, optional): Rows per file when `split` is True. Defaults to 100000.
+        compress (bool, optional): Whether to gzip the files written when `split` is True. Defaults to False.
+        workers (int, optional): Number of files written at once when `split` is True. Defaults to 4.
     """
 
-    dat = pd.read_csv(f) if not isinstance(f, pd.DataFrame) else f
-    dat = dat.assign(Date=pd.to_datetime(dat["Date"], utc=True))
-    dat = dat.assign(
-        Date=(dat["Date"] - pd.Timestamp("1970-01-01", tz="UTC")) // pd.Timedelta("1s")
-    )
-    dat = dat.rename(
-        columns={"ID": "station", "Date": "timestamp", "product": "platform"}
-    )
+    dat = pd.read_csv(f, dtype=CSV_DTYPES) if not isinstance(f, pd.DataFrame) else f
+
+    station = dat["ID"].astype("category").cat
+    platform = dat["product"].astype("category").cat
+    element = _recode(dat["element"], rules.element_names)
+    units = _recode(dat["units"], rules.unit_names, fill="unitless")
 
-    dat = dat.replace(
+    # Scale factors, unit overrides and drops are looked up per row from tables compiled
+    # over the platform and element categories, then applied in a single pass.
+    compiled = rules.compile(platform.categories, element.categories, units.categories)
+    idx = compiled.lookup(platform.codes.to_numpy(), element.codes)
+    # Missing values are filled before scaling, so they are stored scaled like any other value.
+    value = dat["value"].to_numpy(dtype="float64")
+    value = np.where(np.isnan(value), -9999, value) * compiled.scale[idx]
+    unit_codes = np.where(compiled.units[idx] >= 0, compiled.units[idx], units.codes)
+    keep = ~compiled.drop[idx]
+
+    dat = pd.DataFrame(
         {
-            "element": {
-                "ET_500m": "ET",
-                "Fpar_500m": "Fpar",
-                "GPP_gpp_mean": "GPP",
-                "Geophysical_Data_sm_rootzone": "sm_rootzone",
-                "Geophysical_Data_sm_rootzone_wetness": "sm_rootzone_wetness",
-                "Geophysical_Data_sm_surface": "sm_surface",
-                "Geophysical_Data_sm_surface_wetness": "sm_surface_wetness",
-                "Gpp_500m": "GPP",
-                "Lai_500m": "LAI",
-                "PET_500m": "PET",
-                "_500m_16_days_EVI": "EVI",
-                "_500m_16_days_NDVI": "NDVI",
-                "_500_m_16_days_EVI": "EVI",
-                "_500_m_16_days_NDVI": "NDVI",
-                "EVAPOTRANSPIRATION_ALEXI_ETdaily": "ET",
-                "EVAPOTRANSPIRATION_PT_JPL_ETdaily": "ET",
-            }
+            "station": pd.Categorical.from_codes(
+                station.codes.to_numpy()[keep], categories=station.categories
+            ),
+            "timestamp": _parse_timestamps(dat["Date"])[keep],
+            "element": pd.Categorical.from_codes(
+                element.codes[keep], categories=element.categories
+            ),
+            "value": value[keep],
+            "platform": pd.Categorical.from_codes(
+                platform.codes.to_numpy()[keep], categories=platform.categories
+            ),
+            "units": pd.Categorical.from_codes(
+                unit_codes[keep], categories=compiled.unit_categories
+            ),
         }
     )
-    dat = dat.assign(
-        id=dat.station
-        + "_"
-        + dat.timestamp.astype(str)
-        + "_"
-        + dat.platform
-        + "_"
-        + dat.element
-    )
-    dat = dat.assign(units=dat.units.fillna("unitless"))
-    dat = dat.assign(value=dat.value.fillna(-9999))
-    dat = dat.assign(
-        units=np.where(
-            (dat.units == "EVI") | (dat.units == "NDVI"), "unitless", dat.units
-        )
-    )
-    dat = dat.assign(
-        value=np.where(
-            (dat.platform != "SPL4CMDL.006") & (dat.element == "GPP"),
-            (dat.value * 1000) / 8,
-            dat.value,
-        )
-    )
-    dat = dat.assign(
-        value=np.where(
-            (dat.element == "ET") & (dat.platform != "ECO3ETALEXI.001"),
-            dat.value / 8,
-            dat.value,
-        )
-    )
-    dat = dat.assign(value=np.where(dat.element == "PET", dat.value / 8, dat.value))
-    dat = dat.assign(
-        units=np.where(
-            (dat.platform != "SPL4CMDL.006") & (dat.element == "GPP"),
-            "gCm^-2day^-1",
-            dat.units,
-        )
-    )
-
-    dat = dat[dat["element"] != "Geophysical_Data_sm_rootzone_pctl"]
-    dat = dat[dat["element"] != "_500_m_16_days_EVI2"]
+    dat = dat.assign(id=observation_ids(dat, compact=compact_ids))
 
     dat = dat.drop_duplicates()
     dat = dat.reset_index(drop=True)
     logger.info("Data successfully reformatted.")
     if write:
-        if split:
-            out_name = Path(f).stem if not out_name else out_name
-            groups = dat.groupby(np.arange(len(dat.index)) // 5000)
-            for (num, tmp) in groups:
-                tmp_name = f"{out_name}_{num}.csv"
-                tmp.to_csv(Path(neo4j_pth) / tmp_name, index=False)
+        out_name = Path(f).stem if not out_name else out_name
+        if admin_import:
+            write_admin_import(dat, neo4j_pth, out_name)
+        elif split:
+            write_shards(dat, neo4j_pth, out_name, shard_size, compress, workers)
         else:
             dat.to_csv(Path(neo4j_pth) / f"{out_name}.csv", index=False)
 
     return dat
 
 
+def _parse_timestamps(dates: pd.Series) -> np.ndarray:
+    """Convert dates to seconds since 1970-01-01, parsing each distinct date only once."""
+    codes, uniques = pd.factorize(dates, use_na_sentinel=False)
+    parsed = pd.to_datetime(pd.Series(uniques), utc=True)
+    seconds = (parsed - pd.Timestamp("1970-01-01", tz="UTC")) // pd.Timedelta("1s")
+    return seconds.to_numpy()[codes]
+
+
+def _recode(
+    col: pd.Series, mapping: Dict[str, str], fill: Optional[str] = None
+) -> pd.Categorical:
+    """Rename the categories of a column, merging categories that map to the same name."""
+    col = col.astype("category")
+    names = col.cat.categories.map(lambda x: mapping.get(x, x))
+    new_codes, categories = pd.factorize(names)
+    codes = col.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    if fill is not None and (codes < 0).any():
+        if fill not in categories:
+            categories = categories.append(pd.Index([fill]))
+        codes = np.where(codes >= 0, codes, categories.get_loc(fill))
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def observation_ids(dat: pd.DataFrame, compact: bool = False) -> np.ndarray:
+    """Build the id of each observation from its station, timestamp, platform and element.
+
+    String ids are formatted as station_timestamp_platform_element. Compact ids are a
+    stable 64-bit hash of the station/platform/element series mixed with the timestamp,
+    which keeps the unique id index and import files much smaller. Either way, each
+    part is only formatted or hashed once per distinct value.
+
+    Args:
+        dat (pd.DataFrame): Data with 'station', 'timestamp', 'platform' and 'element' columns.
+        compact (bool, optional): Whether to build int64 keys instead of strings. Defaults to False.
+
+    Returns:
+        np.ndarray: The id of each row.
+
+    Raises:
+        ValueError: If any row is missing its station, platform or element.
+    """
+    missing = dat[["station", "platform", "element"]].isna().any()
+    if missing.any():
+        raise ValueError(
+            f"Can't build observation ids with missing {', '.join(missing.index[missing])}."
+        )
+    station = dat["station"].astype("category").cat
+    platform = dat["platform"].astype("category").cat
+    element = dat["element"].astype("category").cat
+    platforms = platform.categories.astype(str)
+    elements = element.categories.astype(str)
+
+    if compact:
+        stations = station.categories.astype(str)
+        series = (
+            station.codes.to_numpy().astype("int64") * len(platforms)
+            + platform.codes.to_numpy()
+        ) * len(elements) + element.codes.to_numpy()
+        series_codes, series_uniques = pd.factorize(series)
+        names = np.array(
+            [
+                f"{stations[x // (len(platforms) * len(elements))]}_"
+                f"{platforms[x // len(elements) % len(platforms)]}_"
+                f"{elements[x % len(elements)]}"
+                for x in series_uniques
+            ],
+            dtype=object,
+        )
+        series_hash = pd.util.hash_array(names)[series_codes]
+        timestamp = dat["timestamp"].to_numpy().astype("int64").view("uint64")
+        return _mix64(series_hash ^ (timestamp * np.uint64(0x9E3779B97F4A7C15))).view(
+            "int64"
+        )
+
+    prefix = station.categories.astype(str).to_numpy(dtype=object) + "_"
+    ts_codes, ts = pd.factorize(dat["timestamp"])
+    ts = ts.astype(str).to_numpy(dtype=object) + "_"
+    series = (
+        platform.codes.to_numpy().astype("int64") * len(elements)
+        + element.codes.to_numpy()
+    )
+    series_codes, series_uniques = pd.factorize(series)
+    suffix = np.array(
+        [
+            f"{platforms[x // len(elements)]}_{elements[x % len(elements)]}"
+            for x in series_uniques
+        ],
+        dtype=object,
+    )
+    return prefix[station.codes.to_numpy()] + ts[ts_codes] + suffix[series_codes]
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """The splitmix64 finalizer, which spreads every input bit over the whole 64-bit output."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def iter_to_db_format(
+    chunks: Iterable[pd.DataFrame], compact_ids: bool = False
+) -> Iterator[pd.DataFrame]:
+    """Reformat a stream of cleaned chunks, such as those from iter_clean_all, for the database.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Cleaned chunks of AppEEARS data.
+        compact_ids (bool, optional): Whether to build compact int64 ids instead of strings. Defaults to False.
+
+    Yields:
+        pd.DataFrame: Each chunk reformatted with to_db_format. Empty chunks are skipped.
+    """
+    for chunk in chunks:
+        dat = to_db_format(
+            f=chunk,
+            neo4j_pth=None,
+            out_name=None,
+            write=False,
+            split=False,
+            compact_ids=compact_ids,
+        )
+        if len(dat):
+            yield dat
+
+
+def stream_to_db_format(
+    f: Union[str, Path],
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    rules: FormatRules = DEFAULT_RULES,
+    compact_ids: bool = False,
+    seen: Optional[IdIndex] = None,
+) -> Iterator[pd.DataFrame]:
+    """Reformat a master_db.csv for the database a chunk at a time.
+
+    Only `chunksize` rows of the input are held at once, plus the hashes of the ids already
+    yielded, which are used to drop observations repeated across chunk boundaries.
+
+    Args:
+        f (Union[str, Path]): Path to raw master_db.csv file.
+        chunksize (int, optional): Number of input rows to read at a time. Defaults to DEFAULT_CHUNKSIZE.
+        rules (FormatRules, optional): Element and unit renames, scale factors and dropped elements to apply.
+            Defaults to DEFAULT_RULES.
+        compact_ids (bool, optional): Whether to build compact int64 ids instead of strings. Defaults to False.
+        seen (Optional[IdIndex], optional): Ids to skip, e.g. those already in the database. Ids that are
+            yielded are added to it. Defaults to None, which starts from an empty in-memory index.
+
+    Yields:
+        pd.DataFrame: Each chunk reformatted with to_db_format, without ids yielded before. Empty chunks are skipped.
+    """
+    seen = IdIndex() if seen is None else seen
+    rows = 0
+    with pd.read_csv(f, dtype=CSV_DTYPES, chunksize=chunksize) as reader:
+        for chunk in reader:
+            dat = to_db_format(
+                f=chunk,
+                neo4j_pth=None,
+                out_name=None,
+                write=False,
+                split=False,
+                rules=rules,
+                compact_ids=compact_ids,
+            )
+            dat = dat.drop_duplicates(subset="id")
+            dat = dat[~seen.contains(dat["id"])].reset_index(drop=True)
+            seen.add(dat["id"])
+            rows += len(dat)
+            if len(dat):
+                yield dat
+    logger.info(f"Reformatted {rows} unique observations from {f}.")
+
+
+def write_shards(
+    dat: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    out_dir: Union[str, Path],
+    out_name: str = "data_init",
+    shard_size: int = 100000,
+    compress: bool = False,
+    workers: int = 4,
+) -> Path:
+    """Write to_db_format data as CSV shards for LOAD CSV, along with a manifest of the shards.
+
+    Shards are written concurrently, optionally gzipped (which LOAD CSV reads directly),
+    and listed in {out_name}_manifest.json with their row counts and sha256 checksums.
+    The manifest is written last, so it only exists once every shard is complete.
+
+    `dat` can also be a stream of chunks, such as from stream_to_db_format. Chunks are cut
+    into shards as they arrive and at most `workers` shards are waiting to be written, so
+    memory is bounded by the chunk and shard sizes rather than the size of the data.
+
+    Args:
+        dat (Union[pd.DataFrame, Iterable[pd.DataFrame]]): Data reformatted with to_db_format, or chunks of it.
+        out_dir (Union[str, Path]): Directory to write the shards to, usually the Neo4j import directory.
+        out_name (str, optional): Prefix of the file names. Defaults to "data_init".
+        shard_size (int, optional): Rows per shard. Defaults to 100000.
+        compress (bool, optional): Whether to gzip the shards. Defaults to False.
+        workers (int, optional): Number of shards written at once. Defaults to 4.
+
+    Returns:
+        Path: The path of the manifest.
+    """
+    out_dir = Path(out_dir)
+    suffix = ".csv.gz" if compress else ".csv"
+    chunks = [dat] if isinstance(dat, pd.DataFrame) else dat
+
+    def write(num: int, tmp: pd.DataFrame) -> Dict[str, Any]:
+        f = out_dir / f"{out_name}_{num:05d}{suffix}"
+        tmp.to_csv(f, index=False, compression="gzip" if compress else None)
+        return {"file": f.name, "rows": len(tmp), "sha256": _sha256(f)}
+
+    shards = []
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(tmp: pd.DataFrame):
+            if len(pending) >= workers:
+                shards.append(pending.popleft().result())
+            pending.append(executor.submit(write, len(shards) + len(pending), tmp))
+
+        # Rows left over from a chunk are carried into the next so shards stay full.
+        rest = None
+        for chunk in chunks:
+            if rest is not None:
+                chunk = pd.concat([rest, chunk], ignore_index=True)
+            full = len(chunk) - len(chunk) % shard_size
+            for start in range(0, full, shard_size):
+                submit(chunk.iloc[start : start + shard_size])
+            rest = chunk.iloc[full:] if full < len(chunk) else None
+        if rest is not None:
+            submit(rest)
+        shards.extend(x.result() for x in pending)
+
+    rows = sum(x["rows"] for x in shards)
+    manifest = out_dir / f"{out_name}_manifest.json"
+    tmp = manifest.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"rows": rows, "shards": shards}, indent=2))
+    os.replace(tmp, manifest)
+    logger.info(f"Wrote {len(shards)} shards of {rows} rows to {out_dir}.")
+    return manifest
+
+
+def read_manifest(
+    manifest: Union[str, Path], verify: bool = False
+) -> List[Dict[str, Any]]:
+    """Read the shards listed in a manifest written by write_shards.
+
+    Args:
+        manifest (Union[str, Path]): Path of the manifest.
+        verify (bool, optional): Whether to check every shard exists and matches its checksum. Defaults to False.
+
+    Raises:
+        ValueError: If `verify` is True and a shard is missing or doesn't match its checksum.
+
+    Returns:
+        List[Dict[str, Any]]: The 'file' (as a full path), 'rows' and 'sha256' of each shard.
+    """
+    manifest = Path(manifest)
+    shards = json.loads(manifest.read_text())["shards"]
+    for shard in shards:
+        shard["file"] = manifest.parent / shard["file"]
+        if verify and (
+            not shard["file"].exists() or _sha256(shard["file"]) != shard["sha256"]
+        ):
+            raise ValueError(f"{shard['file']} is missing or doesn't match {manifest}.")
+    return shards
+
+
+def find_init_files(f_dir: Union[str, Path], verify: bool = False) -> List[Path]:
+    """Find the 'data_init' files to load, from their manifests if there are any.
+
+    Args:
+        f_dir (Union[str, Path]): The directory with the 'data_init' files.
+        verify (bool, optional): Whether to check shards against their manifest checksums. Defaults to False.
+
+    Returns:
+        List[Path]: The files to load, in order.
+    """
+    f_dir = Path(f_dir)
+    manifests = sorted(f_dir.glob("data_init*_manifest.json"))
+    if manifests:
+        return [shard["file"] for m in manifests for shard in read_manifest(m, verify)]
+    return sorted(
+        f for f in f_dir.glob("data_init*") if f.name.endswith((".csv", ".csv.gz"))
+    )
+
+
+def _sha256(f: Path) -> str:
+    h = hashlib.sha256()
+    with open(f, "rb") as fh:
+        for block in iter(lambda: fh.read(2**20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_admin_import(
+    dat: pd.DataFrame, out_dir: Union[str, Path], out_name: str = "data_init"
+) -> Dict[str, Path]:
+    """Write to_db_format data as typed node and relationship files for `neo4j-admin import`.
+
+    Writes Station, Observation and Watermark nodes and OBSERVES relationships, each with
+    a header row in neo4j-admin import format, so a database can be built offline
+    without going through transactions. A Migration node records that the watermarks
+    cover every series.
+
+    Args:
+        dat (pd.DataFrame): Data reformatted with to_db_format.
+        out_dir (Union[str, Path]): Directory to write the files to.
+        out_name (str, optional): Prefix of the file names. Defaults to "data_init".
+
+    Returns:
+        Dict[str, Path]: Paths of the written files, keyed by 'stations', 'observations', 'watermarks',
+            'migrations' and 'observes'.
+    """
+    out_dir = Path(out_dir)
+    files = {
+        k: out_dir / f"{out_name}_{k}.csv"
+        for k in ["stations", "observations", "watermarks", "migrations", "observes"]
+    }
+
+    stations = pd.DataFrame({"name:ID(Station)": dat.station.unique()})
+    stations.to_csv(files["stations"], index=False)
+
+    observations = dat[["id", "platform", "element", "value", "units"]].rename(
+        columns={"id": "id:ID(Observation)", "value": "value:double"}
+    )
+    if pd.api.types.is_integer_dtype(dat["id"]):
+        # neo4j-admin stores :ID values as strings, so compact ids are also kept as a long property.
+        observations = observations.assign(**{"id:long": dat["id"]})
+        observations = observations.rename(
+            columns={"id:ID(Observation)": ":ID(Observation)"}
+        )
+    observations.to_csv(files["observations"], index=False)
+
+    watermarks = (
+        dat.groupby(["station", "platform", "element"], observed=True)["timestamp"]
+        .agg(["min", "max"])
+        .reset_index()
+        .rename(columns={"min": "earliest:long", "max": "latest:long"})
+    )
+    watermarks.to_csv(files["watermarks"], index=False)
+    pd.DataFrame({"name:ID(Migration)": ["watermarks"]}).to_csv(
+        files["migrations"], index=False
+    )
+
+    observes = dat[["station", "id", "timestamp", "element", "platform"]].rename(
+        columns={
+            "station": ":START_ID(Station)",
+            "id": ":END_ID(Observation)",
+            "timestamp": "timestamp:long",
+        }
+    )
+    observes.to_csv(files["observes"], index=False)
+
+    logger.info(f"Wrote neo4j-admin import files to {out_dir}.")
+    return files
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser("Convenience to help run as root.")
@@ -154,6 +509,67 @@ if __name__ == "__main__":
         action="store_false",
         help="Don't split data into smaller subsets.",
     )
+    parser.add_argument(
+        "--admin-import",
+        dest="admin_import",
+        action="store_true",
+        help="Write node and relationship files for neo4j-admin import.",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=100000,
+        help="Rows per file when splitting.",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Gzip the files written when splitting.",
+    )
+    parser.add_argument(
+        "--compact-ids",
+        dest="compact_ids",
+        action="store_true",
+        help="Build compact int64 ids instead of strings.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Read and reformat the file this many rows at a time instead of all at once.",
+    )
     args = parser.parse_args()
 
-    to_db_format(args.file, args.outdir, args.outname, args.write, args.split)
+    if args.chunksize is not None:
+        if args.admin_import:
+            parser.error(
+                "--admin-import needs the whole file and can't be used with --chunksize."
+            )
+        chunks = stream_to_db_format(
+            args.file, chunksize=args.chunksize, compact_ids=args.compact_ids
+        )
+        if args.write and args.split:
+            write_shards(
+                chunks, args.outdir, str(args.outname), args.shard_size, args.compress
+            )
+        elif args.write:
+            out = args.outdir / f"{args.outname}.csv"
+            for num, dat in enumerate(chunks):
+                dat.to_csv(
+                    out, index=False, mode="w" if num == 0 else "a", header=num == 0
+                )
+        else:
+            for _ in chunks:
+                pass
+    else:
+        to_db_format(
+            args.file,
+            args.outdir,
+            args.outname,
+            args.write,
+            args.split,
+            args.admin_import,
+            compact_ids=args.compact_ids,
+            shard_size=args.shard_size,
+            compress=args.compress,
+        )
@@ -8,19 +8,19 @@ from typing import List, Optional, Union
 import pandas as pd
 from loguru import logger
 
-from .Clean import clean_all
+from .Backend import StorageBackend
+from .Clean import DEFAULT_MEMORY_BUDGET, iter_clean_all
 from .Geom import Point
-from .Neo4jConn import MesonetSatelliteDB
 from .Product import Product
 from .Session import Session
 from .Task import PendingTaskError, Submit
-from .to_db_format import to_db_format
+from .to_db_format import iter_to_db_format
 
 RM_STRINGS = ["_pft", "_std_", "StdDev", "_EVI2", "_pctl"]
 
 
 @logger.catch
-def find_missing_data(conn: MesonetSatelliteDB, backfill: bool=False) -> pd.DataFrame:
+def find_missing_data(conn: StorageBackend, backfill: bool=False) -> pd.DataFrame:
     """Looks for the last timestamp for each product and returns the information in a dataframe
 
     Returns:
@@ -36,7 +36,7 @@ def find_missing_data(conn: MesonetSatelliteDB, backfill: bool=False) -> pd.Data
 
 @logger.catch
 def start_missing_tasks(
-    conn: MesonetSatelliteDB, session: Session, start_now: bool = True, backfill: bool=False, stations: Optional[List]=None
+    conn: StorageBackend, session: Session, start_now: bool = True, backfill: bool=False, stations: Optional[List]=None
 ) -> List[Submit]:
     """Finds the last data downloaded for each product and starts tasks to fill the missing data.
 
@@ -139,20 +139,23 @@ def wait_on_tasks(
 
 
 @logger.catch
-def update_db(dirname: Union[Path, str], conn=MesonetSatelliteDB):
+def update_db(
+    dirname: Union[Path, str],
+    conn: StorageBackend,
+    batch_size: int = 5000,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+):
 
-    logger.info("Starting upload to Neo4j DB.")
-    cleaned = clean_all(dirname, False)
-    formatted = to_db_format(
-        f=cleaned, neo4j_pth=None, out_name=None, write=False, split=False
-    )
-    formatted.reset_index(drop=True, inplace=True)
-    conn.post(formatted)
-    logger.info("Upload to Neo4j DB complete.")
+    logger.info("Starting upload to the database.")
+    # Clean, reformat and post one chunk at a time so memory use stays within the budget.
+    chunks = iter_clean_all(dirname, memory_budget)
+    for formatted in iter_to_db_format(chunks, compact_ids=conn.compact_ids):
+        conn.post(formatted, batch_size=batch_size)
+    logger.info("Upload to the database complete.")
 
 
 @logger.catch
-def operational_update(conn, session, backfill: bool=False, stations: Optional[List[str]]=None):
+def operational_update(conn: StorageBackend, session: Session, backfill: bool=False, stations: Optional[List[str]]=None):
 
     with tempfile.TemporaryDirectory() as dirname:
         tasks = start_missing_tasks(conn=conn, session=session, start_now=True, backfill=backfill, stations=stations)
@@ -0,0 +1,70 @@
+import pandas as pd
+
+from mt_mesonet_satellite import QueryCache
+
+
+class FakeDB:
+    """Stands in for MesonetSatelliteDB._query, with one observation a day."""
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, start_time, end_time):
+        self.calls.append((start_time, end_time))
+        days = range(-(-start_time // 86400) * 86400, end_time + 1, 86400)
+        return pd.DataFrame({"date": list(days), "value": [float(x) for x in days]})
+
+
+def get(cache, db, start_time, end_time):
+    return cache.get("aceabsar", "NDVI", start_time, end_time, db.fetch)
+
+
+def test_hit_is_sliced_from_the_cached_range():
+    cache, db = QueryCache(), FakeDB()
+    get(cache, db, 0, 10 * 86400)
+    dat = get(cache, db, 86400, 3 * 86400)
+    assert dat["date"].tolist() == [86400, 2 * 86400, 3 * 86400]
+    assert db.calls == [(0, 10 * 86400)]
+    assert cache.stats() == {"hits": 1, "partial_hits": 0, "misses": 1, "size": 1}
+
+
+def test_partial_hit_only_fetches_the_missing_end():
+    cache, db = QueryCache(), FakeDB()
+    get(cache, db, 0, 5 * 86400)
+    dat = get(cache, db, 3 * 86400, 8 * 86400)
+    assert dat["date"].tolist() == [x * 86400 for x in range(3, 9)]
+    assert db.calls == [(0, 5 * 86400), (5 * 86400 + 1, 8 * 86400)]
+    assert cache.stats() == {"hits": 0, "partial_hits": 1, "misses": 1, "size": 1}
+
+
+def test_miss_returns_a_copy_of_the_cached_data():
+    cache, db = QueryCache(), FakeDB()
+    dat = get(cache, db, 0, 2 * 86400)
+    dat["value"] = -1.0
+    assert get(cache, db, 0, 2 * 86400)["value"].tolist() == [0.0, 86400.0, 172800.0]
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("mt_mesonet_satellite.Cache.time.monotonic", lambda: now[0])
+    cache, db = QueryCache(ttl=60), FakeDB()
+    get(cache, db, 0, 86400)
+    now[0] += 61
+    get(cache, db, 0, 86400)
+    assert len(db.calls) == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_invalidate_drops_entries_and_in_flight_fetches():
+    cache, db = QueryCache(), FakeDB()
+    get(cache, db, 0, 86400)
+    cache.invalidate("aceabsar", "NDVI")
+    assert cache.stats()["size"] == 0
+
+    def fetch(start_time, end_time):
+        # Another thread posts new data for this series while the query runs.
+        cache.invalidate("aceabsar", "NDVI")
+        return db.fetch(start_time, end_time)
+
+    cache.get("aceabsar", "NDVI", 0, 86400, fetch)
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from mt_mesonet_satellite import IdIndex, observation_ids
+
+
+class FakeConn:
+    """Stands in for MesonetSatelliteDB.iter_ids, which returns ids as the driver does."""
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def iter_ids(self, chunk_size):
+        yield self.ids
+
+    def count_ids(self):
+        return len(self.ids)
+
+
+def observations():
+    return pd.DataFrame(
+        {
+            "station": ["aceabsar", "aceabsar", "acebozem"],
+            "timestamp": [1640995200, 1641081600, 1640995200],
+            "platform": ["MOD13A1.061"] * 3,
+            "element": ["NDVI", "NDVI", "EVI"],
+        }
+    )
+
+
+def test_build_from_compact_ids_round_trips():
+    ids = observation_ids(observations(), compact=True)
+    # The driver returns Python ints, which used to hash differently from int64 arrays.
+    index = IdIndex().build(FakeConn(np.asarray(ids.tolist(), dtype=object)))
+    assert index.contains(observation_ids(observations(), compact=True)).all()
+
+
+def test_build_from_string_ids_round_trips():
+    ids = observation_ids(observations())
+    index = IdIndex().build(FakeConn(np.asarray(list(ids), dtype=object)))
+    assert index.contains(observation_ids(observations())).all()
+    assert not index.contains(["aceabsar_0_MOD13A1.061_NDVI"]).any()
+
+
+def test_missing_series_parts_raise():
+    # Relationships written before migrate-observes have no platform or element.
+    dat = observations().assign(platform=["MOD13A1.061", None, "MOD13A1.061"])
+    with pytest.raises(ValueError, match="platform"):
+        observation_ids(dat, compact=True)
+
+
+def test_index_is_stale_once_the_database_changes():
+    ids = observation_ids(observations(), compact=True)
+    index = IdIndex().build(FakeConn(ids))
+    assert not index.is_stale(FakeConn(ids))
+    # e.g. the database was restored from a backup taken before the last observation.
+    assert index.is_stale(FakeConn(ids[:-1]))
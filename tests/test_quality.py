@@ -0,0 +1,100 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from mt_mesonet_satellite import (
+    DEFAULT_POLICIES,
+    Cleaner,
+    Product,
+    ProductCache,
+    QualityRule,
+)
+
+
+def layer(name, units, valid_min, valid_max, fill, is_qa, quality_layers=""):
+    return {
+        "AddOffset": None,
+        "Available": True,
+        "DataType": "float32",
+        "Description": "",
+        "Dimensions": ["time", "lat", "lon"],
+        "FillValue": fill,
+        "IsQA": is_qa,
+        "Layer": name,
+        "OrigDataType": "int16",
+        "OrigValidMax": valid_max,
+        "OrigValidMin": valid_min,
+        "QualityLayers": quality_layers,
+        "QualityProductAndVersion": "",
+        "ScaleFactor": None,
+        "Units": units,
+        "ValidMax": valid_max,
+        "ValidMin": valid_min,
+        "XSize": 1,
+        "YSize": 1,
+    }
+
+
+def test_rule_decodes_its_bit_field():
+    # MODLAND QA, bits 0-1, accepting good (0) and check other QA (1).
+    rule = QualityRule(0, 2, (0, 1))
+    qa = np.array([0, 1, 2, 3, 4, 0b1101])
+    assert rule.passes(qa).tolist() == [True, True, False, False, True, True]
+
+    # SCF_QC, bits 5-7, accepting the main algorithm with or without saturation.
+    rule = QualityRule(5, 3, (0, 1))
+    qa = np.array([0b00000000, 0b00100000, 0b01000000, 0b11100001, 0b00011111])
+    assert rule.passes(qa).tolist() == [True, True, False, False, True]
+
+
+def test_policy_needs_every_rule_and_passes_missing_qa():
+    policy = DEFAULT_POLICIES["MOD16A2.061"]
+    # Good, MODLAND_QC set, main algorithm with saturation, backup algorithm, missing.
+    qa = np.array([0.0, 1.0, 32.0, 64.0, np.nan])
+    assert policy.passes("ET_QC_500m", qa).tolist() == [True, False, True, False, True]
+    assert policy.passes("Unknown_QC", qa).all()
+
+
+def test_clean_sets_observations_failing_quality_to_na(tmp_path):
+    products = {
+        "MOD13A1.061": {
+            "fetched": time.time(),
+            "layers": {
+                "_500m_16_days_NDVI": layer(
+                    "_500m_16_days_NDVI",
+                    "NDVI",
+                    -2000,
+                    10000,
+                    -3000,
+                    False,
+                    "['_500m_16_days_VI_Quality']",
+                ),
+                "_500m_16_days_VI_Quality": layer(
+                    "_500m_16_days_VI_Quality", "bit field", 0, 65534, 65535, True
+                ),
+            },
+        }
+    }
+    with open(tmp_path / "products.json", "w") as out:
+        json.dump(products, out)
+    f = tmp_path / "aceabsar-MOD13A1-061-results.csv"
+    pd.DataFrame(
+        {
+            "ID": ["aceabsar"] * 4,
+            "Date": ["2022-01-01", "2022-01-17", "2022-02-02", "2022-02-18"],
+            "MOD13A1_061__500m_16_days_NDVI": [5000, 6000, 7000, 8000],
+            "MOD13A1_061__500m_16_days_VI_Quality": [0, 2, np.nan, 1],
+        }
+    ).to_csv(f, index=False)
+
+    meta = Product("MOD13A1.061", cache=ProductCache(tmp_path / "products.json"))
+    dat = Cleaner(f, meta=meta, quality=DEFAULT_POLICIES["MOD13A1.061"]).clean()
+    dat = dat.sort_values("Date")
+    assert dat["element"].astype(str).unique().tolist() == ["_500m_16_days_NDVI"]
+    np.testing.assert_array_equal(dat["value"], [5000, np.nan, 7000, 8000])
+
+    # Without a policy the QA layer isn't read, so nothing is masked.
+    dat = Cleaner(f, meta=meta).clean().sort_values("Date")
+    np.testing.assert_array_equal(dat["value"], [5000, 6000, 7000, 8000])
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from mt_mesonet_satellite import to_db_format
+
+
+def test_missing_values_are_filled_before_scaling():
+    dat = pd.DataFrame(
+        {
+            "ID": ["aceabsar", "aceabsar"],
+            "Date": ["2022-01-01", "2022-01-09"],
+            "element": ["Gpp_500m", "Gpp_500m"],
+            "value": [0.008, np.nan],
+            "product": ["MOD17A2HGF.061", "MOD17A2HGF.061"],
+            "units": ["kgC/m^2", "kgC/m^2"],
+        }
+    )
+    out = to_db_format(dat, neo4j_pth=None)
+    assert out["value"].tolist() == [1.0, -9999 * 1000 / 8]
+    assert (out["units"] == "gCm^-2day^-1").all()
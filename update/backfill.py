@@ -11,7 +11,14 @@ import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from loguru import logger
-from mt_mesonet_satellite import MesonetSatelliteDB, Session, operational_update
+from mt_mesonet_satellite import (
+    LocalSatelliteDB,
+    MesonetSatelliteDB,
+    Session,
+    StorageBackend,
+    observation_ids,
+    operational_update,
+)
 from neo4j.exceptions import ConfigurationError
 
 load_dotenv("/setup/.env")
@@ -51,20 +58,26 @@ def convert_date_to_seconds(d: Union[dt.date, dt.datetime, str]) -> int:
     return int((d - dt.datetime(1970, 1, 1)).total_seconds())
 
 
-def get_earliest_record(conn: MesonetSatelliteDB) -> None:
+def get_earliest_record(conn: StorageBackend) -> None:
     stations = pd.read_csv(
         "https://mesonet.climate.umt.edu/api/v2/stations?type=csv"
     )
 
+    # Query every station at once and check which ones returned data.
+    out = conn.query_many(
+        stations['station'].to_list(),
+        ["NDVI"],
+        convert_date_to_seconds("2020-01-01"),
+        convert_date_to_seconds("2020-03-01"),
+    )
+    has_data = set(out["station"])
+
     date_records = {}
     for station in stations['station'].to_list():
-        print(f"Processing {station}...")
-        out = conn.query(station, convert_date_to_seconds("2020-01-01"),
-                convert_date_to_seconds("2020-03-01"), "NDVI")
-        if len(out) == 0:
-            d = dt.date.today()
-        else:
+        if station in has_data:
             d = dt.date(2000, 1, 1)
+        else:
+            d = dt.date.today()
 
         date_records[station] = d
     
@@ -74,60 +87,46 @@ def get_earliest_record(conn: MesonetSatelliteDB) -> None:
     return date_records
 
 def backfill_collocated(
-    station: str, collocated: str, conn: MesonetSatelliteDB
+    station: str, collocated: str, conn: StorageBackend
 ) -> None:
     """Backfill a collocated station with satellite data from the collocated station.
 
     Args:
         station (str): Name of the station to backfill.
         collocated (str): Name of the existing station with data in the database.
-        conn (MesonetSatelliteDB): Connection to the Neo4j database.
+        conn (StorageBackend): Connection to the satellite database.
 
     Returns:
         NoReturn: Nothing is returned, data are written to the database.
     """
-    dfs = []
     now = round((dt.datetime.now() - dt.datetime(1970, 1, 1)).total_seconds())
 
     # Query all of the elements at a station.
-    for element in ELEMENTS:
-        print(element)
-        tmp = conn.query(collocated, 0, now, element)
-        dfs.append(tmp)
-
-    dat = pd.concat(dfs, axis=0)
+    dat = conn.query_many([collocated], ELEMENTS, 0, now)
 
     # Reformat results to match the format of the to_db_format function.
     dat = dat.rename(columns={"date": "timestamp"})
     dat = dat[["station", "timestamp", "element", "value", "platform", "units"]]
     dat = dat.assign(units=dat.units.replace(r"^\s*$", "unitless", regex=True))
     dat = dat.assign(station=station)
-    dat = dat.assign(
-        id=dat.station
-        + "_"
-        + dat.timestamp.astype(str)
-        + "_"
-        + dat.platform
-        + "_"
-        + dat.element
-    )
+    dat = dat.assign(id=observation_ids(dat, compact=conn.compact_ids))
     dat = dat.reset_index(drop=True)
 
-    # Post data to database.
-    conn.post(dat)
+    # Post data to database in batched transactions.
+    conn.post(dat, batch_size=5000)
 
 
-def backfill_isolated(stations: List[str], session: Session, conn: MesonetSatelliteDB):
+def backfill_isolated(stations: List[str], session: Session, conn: StorageBackend):
     operational_update(conn=conn, session=session, backfill=True, stations=stations)
 
 
-def execute_backfill(stations: List[str], session: Session, conn: MesonetSatelliteDB):
+def execute_backfill(stations: List[str], session: Session, conn: StorageBackend):
     """Execute the backfill logic for a list of stations.
     
     Args:
         stations (List[str]): List of station names to backfill.
         session (Session): Session object for API access.
-        conn (MesonetSatelliteDB): Connection to the Neo4j database.
+        conn (StorageBackend): Connection to the satellite database.
     """
     station_df = pd.read_csv(
         "https://mesonet.climate.umt.edu/api/v2/stations?type=csv"
@@ -162,12 +161,12 @@ def execute_backfill(stations: List[str], session: Session, conn: MesonetSatelli
         backfill_isolated(stations=isolated_l, session=session, conn=conn)
 
 
-def check_and_backfill(session: Session, conn: MesonetSatelliteDB):
+def check_and_backfill(session: Session, conn: StorageBackend):
     """Check station record dates and backfill stations that need it.
     
     Args:
         session (Session): Session object for API access.
-        conn (MesonetSatelliteDB): Connection to the Neo4j database.
+        conn (StorageBackend): Connection to the satellite database.
     """
     # Load station record dates
     station_record_dates = get_earliest_record(conn)
@@ -230,11 +229,16 @@ if __name__ == "__main__":
     load_dotenv("./.env")
 
     try:
-        conn = MesonetSatelliteDB(
-            uri=os.getenv("Neo4jURI"),
-            user=os.getenv("Neo4jUser"),
-            password=os.getenv("Neo4jPassword"),
-        )
+        # Setting LocalStorePath runs the backfill against local Parquet files instead of Neo4j.
+        if os.getenv("LocalStorePath"):
+            conn = LocalSatelliteDB(os.getenv("LocalStorePath"))
+        else:
+            conn = MesonetSatelliteDB(
+                uri=os.getenv("Neo4jURI"),
+                user=os.getenv("Neo4jUser"),
+                password=os.getenv("Neo4jPassword"),
+                compact_ids=os.getenv("CompactIds", "").lower() == "true",
+            )
     except ConfigurationError as e:
         logger.exception(e)
         logger.exception("Unable to connect to Neo4j DB.")
@@ -1,9 +1,15 @@
 import argparse
 import datetime as dt
 import os
+import shlex
+import subprocess
 import tempfile
+import time
+from pathlib import Path
+from typing import Dict
 
 from dotenv import load_dotenv
+from loguru import logger
 from mt_mesonet_satellite import (
     MesonetSatelliteDB,
     Point,
@@ -13,6 +19,45 @@ from mt_mesonet_satellite import (
     to_db_format,
     wait_on_tasks,
 )
+from mt_mesonet_satellite.to_db_format import write_admin_import
+from neo4j.exceptions import ServiceUnavailable
+
+
+def admin_import(files: Dict[str, Path], args: argparse.Namespace) -> None:
+    """Build a fresh database offline from neo4j-admin import files.
+
+    The Neo4j server must be stopped. neo4j-admin sees the files under --import-dir,
+    which is where the linked 'import' volume is mounted inside the Neo4j container.
+    """
+    import_dir = Path(args.import_dir)
+    cmd = shlex.split(args.neo4j_admin) + [
+        "import",
+        f"--database={args.database}",
+        "--force",
+        f"--nodes=Station={import_dir / files['stations'].name}",
+        f"--nodes=Observation={import_dir / files['observations'].name}",
+        f"--nodes=Watermark={import_dir / files['watermarks'].name}",
+        f"--nodes=Migration={import_dir / files['migrations'].name}",
+        f"--relationships=OBSERVES={import_dir / files['observes'].name}",
+    ]
+    logger.info(f"Running {' '.join(cmd)}")
+    subprocess.run(cmd, check=True)
+
+    if args.neo4j_start:
+        subprocess.run(shlex.split(args.neo4j_start), check=True)
+
+
+def wait_for_db(conn: MesonetSatelliteDB, timeout: int = 300) -> None:
+    start = time.time()
+    while True:
+        try:
+            conn.driver.verify_connectivity()
+            return
+        except ServiceUnavailable:
+            if time.time() - start > timeout:
+                raise
+            time.sleep(5)
+
 
 if __name__ == "__main__":
 
@@ -29,6 +74,65 @@ if __name__ == "__main__":
         default="/neo4j/import",
         help="Path to the linked Neo4j 'import' volume.",
     )
+    parser.add_argument(
+        "-bs",
+        "--batch-size",
+        type=int,
+        default=5000,
+        help="Number of rows to write per transaction.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to clean the AppEEARS files in, and of files to load into Neo4j at once.",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=100000,
+        help="Number of rows per 'data_init' file loaded with the Neo4j CSV reader.",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Gzip the 'data_init' files.",
+    )
+    parser.add_argument(
+        "--compact-ids",
+        action="store_true",
+        help="Key observations by compact int64 ids instead of strings.",
+    )
+    parser.add_argument(
+        "--admin-import",
+        action="store_true",
+        help="Build the database offline with neo4j-admin import. The Neo4j server must be stopped.",
+    )
+    parser.add_argument(
+        "--neo4j-admin",
+        type=str,
+        default="neo4j-admin",
+        help="Command used to run neo4j-admin, e.g. 'docker compose run --rm neo4j neo4j-admin'.",
+    )
+    parser.add_argument(
+        "--import-dir",
+        type=str,
+        default="/var/lib/neo4j/import",
+        help="Where neo4j-admin sees the 'import' volume.",
+    )
+    parser.add_argument(
+        "--database",
+        type=str,
+        default="neo4j",
+        help="Name of the database to import into.",
+    )
+    parser.add_argument(
+        "--neo4j-start",
+        type=str,
+        default=None,
+        help="Command that starts the Neo4j server after the import, e.g. 'docker compose up -d neo4j'.",
+    )
 
     args = parser.parse_args()
 
@@ -40,8 +144,10 @@ if __name__ == "__main__":
         uri=os.getenv("Neo4jURI"),
         user=os.getenv("Neo4jUser"),
         password=os.getenv("Neo4jPassword"),
+        compact_ids=args.compact_ids,
     )
-    conn.init_db_indices()
+    if not args.admin_import:
+        conn.init_db_indices()
 
     # Begin an AppEEARS session.
     session = Session(dot_env=False)
@@ -75,29 +181,56 @@ if __name__ == "__main__":
         # checking if the task is complete.
         wait_on_tasks(tasks=viirs, session=session, dirname=dirname, wait=3600)
         # Clean the processed data.
-        cleaned = clean_all(dirname, False)
+        cleaned = clean_all(dirname, False, workers=args.workers)
 
-        # On linux OS, there can be permissions errors with the linked Docker volumes.
-        # If this occurs, manually post the entries to the db (This is slower than using
-        # the builtin Neo4j CSV reader).
-        try:
+        if args.admin_import:
+            # Write typed node/relationship files, import them offline, then create the
+            # constraints and indices once the server is back up.
             formatted = to_db_format(
                 f=cleaned,
-                neo4j_pth=args.neo4jpth,
-                out_name="data_init",
-                write=True,
-                split=True,
+                neo4j_pth=None,
+                out_name=None,
+                write=False,
+                split=False,
+                compact_ids=args.compact_ids,
             )
+            files = write_admin_import(formatted, args.neo4jpth, "data_import")
+            admin_import(files, args)
+            wait_for_db(conn)
+            conn.init_db_indices()
+        else:
+            # On linux OS, there can be permissions errors with the linked Docker volumes.
+            # If this occurs, manually post the entries to the db (This is slower than using
+            # the builtin Neo4j CSV reader).
+            try:
+                formatted = to_db_format(
+                    f=cleaned,
+                    neo4j_pth=args.neo4jpth,
+                    out_name="data_init",
+                    write=True,
+                    split=True,
+                    compact_ids=args.compact_ids,
+                    shard_size=args.shard_size,
+                    compress=args.compress,
+                )
 
-            # Upload the data to the database using the Neo4j CSV reader.
-            conn.init_db(dirname)
-        except (FileNotFoundError, PermissionError) as e:
-            formatted = to_db_format(
-                f=cleaned, neo4j_pth=None, out_name=None, write=False, split=False
-            )
+                # Upload the shards listed in the manifest using the Neo4j CSV reader,
+                # which commits in batches.
+                conn.init_db(
+                    args.neo4jpth, batch_size=args.batch_size, workers=args.workers
+                )
+            except (FileNotFoundError, PermissionError) as e:
+                formatted = to_db_format(
+                    f=cleaned,
+                    neo4j_pth=None,
+                    out_name=None,
+                    write=False,
+                    split=False,
+                    compact_ids=args.compact_ids,
+                )
 
-            # Upload to database row by row.
-            conn.post(formatted)
+                # Upload to database in batched transactions.
+                conn.post(formatted, batch_size=args.batch_size)
 
     session.logout()
     conn.close()
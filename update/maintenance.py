@@ -0,0 +1,214 @@
+#!/usr/local/bin/python
+
+import argparse
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from mt_mesonet_satellite import (
+    IdIndex,
+    MesonetSatelliteDB,
+    ProductCache,
+    stream_to_db_format,
+)
+from mt_mesonet_satellite.Neo4jConn import MAX_TIMESTAMP
+
+
+def rebuild_watermarks(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    conn.rebuild_watermarks()
+
+
+def migrate_observes(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    conn.migrate_observes_properties(batch_size=args.batch_size)
+
+
+def migrate_to_chunks(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    conn.migrate_to_chunks(drop_observations=args.drop_observations)
+
+
+def export(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    conn.export(
+        args.path, stations=args.stations, elements=args.elements, since=args.since
+    )
+
+
+def check_query_plan(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    plan = conn.explain(args.station, 0, MAX_TIMESTAMP, args.element)
+    logger.info("Query plan:\n" + "\n".join(plan))
+    if not any(
+        "RelationshipIndexSeek" in op and "OBSERVES(element, timestamp)" in op
+        for op in plan
+    ):
+        raise SystemExit(
+            "Queries don't use observesElementIndex. Run migrate-observes."
+        )
+
+
+def migrate_ids(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    conn.migrate_to_compact_ids(batch_size=args.batch_size)
+    # The number of ids doesn't change, so update.py wouldn't notice the index is stale.
+    if Path(args.id_index).exists():
+        IdIndex(args.id_index).build(conn)
+
+
+def load_csv(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    for dat in stream_to_db_format(
+        args.path, chunksize=args.chunksize, compact_ids=conn.compact_ids
+    ):
+        conn.post(dat, batch_size=args.batch_size)
+
+
+def refresh_products(conn: MesonetSatelliteDB, args: argparse.Namespace) -> None:
+    ProductCache.default().refresh(args.products or None)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        "One-off maintenance commands for an existing satellite indicators Neo4j database."
+    )
+    parser.add_argument(
+        "-e", "--env", type=str, default=".env", help="Path to your .env file."
+    )
+    parser.add_argument(
+        "--schema",
+        type=str,
+        default="observation",
+        choices=["observation", "chunk"],
+        help="Storage schema of the database.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    watermarks = subparsers.add_parser(
+        "rebuild-watermarks",
+        help="Recompute the per-series earliest/latest timestamps from every observation. "
+        "Required once on databases created before watermarks were kept.",
+    )
+    watermarks.set_defaults(func=rebuild_watermarks)
+
+    observes = subparsers.add_parser(
+        "migrate-observes",
+        help="Copy element/platform onto OBSERVES relationships and create the relationship indexes.",
+    )
+    observes.add_argument(
+        "-bs",
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Number of relationships to update per transaction.",
+    )
+    observes.set_defaults(func=migrate_observes)
+
+    plan = subparsers.add_parser(
+        "check-query-plan",
+        help="Check queries seek the OBSERVES element/timestamp index instead of expanding every relationship.",
+    )
+    plan.add_argument("station", type=str, help="Station to plan a query for.")
+    plan.add_argument(
+        "-el",
+        "--element",
+        type=str,
+        default="NDVI",
+        help="Element to plan a query for.",
+    )
+    plan.set_defaults(func=check_query_plan)
+
+    chunks = subparsers.add_parser(
+        "migrate-to-chunks",
+        help="Copy every Observation node into per-station/element/platform/year Chunk nodes.",
+    )
+    chunks.add_argument(
+        "--drop-observations",
+        action="store_true",
+        help="Delete each station's Observation nodes once its chunks are written.",
+    )
+    chunks.set_defaults(func=migrate_to_chunks)
+
+    exporter = subparsers.add_parser(
+        "export",
+        help="Export observations to Parquet, partitioned by station and element.",
+    )
+    exporter.add_argument("path", type=str, help="Directory to export to.")
+    exporter.add_argument(
+        "-s", "--stations", nargs="+", default=None, help="Stations to export."
+    )
+    exporter.add_argument(
+        "-el", "--elements", nargs="+", default=None, help="Elements to export."
+    )
+    exporter.add_argument(
+        "--since",
+        type=int,
+        default=None,
+        help="Export everything after this time (seconds since 1970-01-01) instead of only what changed since the last export.",
+    )
+    exporter.set_defaults(func=export)
+
+    ids = subparsers.add_parser(
+        "migrate-ids",
+        help="Replace string observation ids with compact int64 ids. Set CompactIds=true afterwards.",
+    )
+    ids.add_argument(
+        "-bs",
+        "--batch-size",
+        type=int,
+        default=10000,
+        help="Number of ids to update per transaction.",
+    )
+    ids.add_argument(
+        "--id-index",
+        type=str,
+        default="/setup/existing_ids.npy",
+        help="Id index of the update script to rebuild with the new ids, if it exists.",
+    )
+    ids.set_defaults(func=migrate_ids)
+
+    loader = subparsers.add_parser(
+        "load-csv",
+        help="Post a master_db.csv written by clean_all, reading it a chunk at a time.",
+    )
+    loader.add_argument("path", type=str, help="master_db.csv file to load.")
+    loader.add_argument(
+        "-cs",
+        "--chunksize",
+        type=int,
+        default=1000000,
+        help="Number of rows of the file to read at a time.",
+    )
+    loader.add_argument(
+        "-bs",
+        "--batch-size",
+        type=int,
+        default=5000,
+        help="Number of rows to write per transaction.",
+    )
+    loader.set_defaults(func=load_csv)
+
+    products = subparsers.add_parser(
+        "refresh-products",
+        help="Fetch the AppEEARS layer metadata of cached products again.",
+    )
+    products.add_argument(
+        "products",
+        nargs="*",
+        default=None,
+        help="Products to refresh, formatted as NAMEOFPRODUCT.XXX. Defaults to every cached product.",
+    )
+    products.set_defaults(func=refresh_products)
+
+    args = parser.parse_args()
+    load_dotenv(args.env)
+
+    conn = MesonetSatelliteDB(
+        uri=os.getenv("Neo4jURI"),
+        user=os.getenv("Neo4jUser"),
+        password=os.getenv("Neo4jPassword"),
+        schema=args.schema,
+        compact_ids=os.getenv("CompactIds", "").lower() == "true",
+    )
+
+    try:
+        args.func(conn, args)
+    finally:
+        conn.close()
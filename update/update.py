@@ -6,7 +6,13 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 from loguru import logger
-from mt_mesonet_satellite import MesonetSatelliteDB, Session, operational_update
+from mt_mesonet_satellite import (
+    IdIndex,
+    LocalSatelliteDB,
+    MesonetSatelliteDB,
+    Session,
+    operational_update,
+)
 from neo4j.exceptions import ConfigurationError
 
 # from mt_mesonet_satellite import Task, Submit, clean_all, to_db_format, Product, Point
@@ -32,12 +38,23 @@ logger.enable("mt_mesonet_satellite")
 
 if __name__ == "__main__":
 
+    # Ids already in the database, so re-downloaded observations aren't re-posted.
+    id_index = IdIndex("/setup/existing_ids.npy")
+
     try:
-        conn = MesonetSatelliteDB(
-            uri=os.getenv("Neo4jURI"),
-            user=os.getenv("Neo4jUser"),
-            password=os.getenv("Neo4jPassword"),
-        )
+        # Setting LocalStorePath runs the update against local Parquet files instead of Neo4j.
+        if os.getenv("LocalStorePath"):
+            conn = LocalSatelliteDB(os.getenv("LocalStorePath"))
+        else:
+            conn = MesonetSatelliteDB(
+                uri=os.getenv("Neo4jURI"),
+                user=os.getenv("Neo4jUser"),
+                password=os.getenv("Neo4jPassword"),
+                id_index=id_index,
+                compact_ids=os.getenv("CompactIds", "").lower() == "true",
+            )
+            if id_index.is_stale(conn):
+                id_index.build(conn)
     except ConfigurationError as e:
         logger.exception(e)
         logger.exception("Unable to connect to Neo4j DB.")